@@ -0,0 +1,212 @@
+from contextlib import contextmanager, nullcontext
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def stage(stats, name, **info):
+    """
+    Returns the context manager that records a stage in stats, or one that
+    only yields an empty dictionary if stats is None
+    """
+    if stats is None:
+        return nullcontext({})
+    return stats.stage(name, **info)
+
+
+class AttributionStats:
+    """
+    Instrumentation of the attribution pipeline
+
+    ...
+
+    Collects the wall time, number of calls and memory of each stage of
+    MarkovDB and MarkovAttribution, plus the time and memory of the removal
+    of each channel. Recording a stage costs a couple of clock reads and a
+    getrusage call, so it can be left on in production. Observers are
+    called after every stage, to forward the measures to a metrics
+    pipeline as they happen.
+
+    Parameters
+    ----------
+    observers : list of callable, optional
+        Functions called as observer(name, record) after each stage, with
+        the record of that call
+    trace_memory : bool
+        If True, the peak memory allocated during each stage is measured
+        with tracemalloc. This is precise but slows the pipeline down. The
+        peak of a stage includes that of the stages nested in it
+
+    Atributes
+    ---------
+    stages : dict
+        For each stage, the number of calls, the total and maximum wall
+        time in seconds, the peak resident memory of the process in bytes
+        and the information given by the stage (matrix sizes, for instance)
+        on its last call
+    channels : dict
+        For each channel, the wall time of its removal, the number of
+        states removed with it, the bytes of the block of the fundamental
+        matrix solved for them and, with trace_memory, the traced peak
+
+    Methods
+    -------
+    stage(name, **info)
+        Context manager that records a stage. It yields a dictionary where
+        the stage can add information known only once it has run
+    channel(channel, removed_states)
+        Context manager that records the removal of a channel
+    add_channel(channel, seconds, removed_states, **info)
+        Records the removal of a channel
+    to_dict()
+        Returns the stages and channels as a dictionary
+    to_records(prefix)
+        Returns a flat list of (metric name, value) pairs
+    """
+
+    def __init__(self, observers=None, trace_memory=False):
+
+        self.observers = list(observers or [])
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self.channels = {}
+        # Running traced peak of each open stage, innermost last
+        self.__peaks = []
+
+    @contextmanager
+    def stage(self, name, **info):
+        """
+        Records the wall time and memory of the code run inside the
+        context, under the given stage name
+        """
+        if self.trace_memory:
+            started_tracing = self.__start_trace()
+
+        start = time.perf_counter()
+        try:
+            yield info
+        finally:
+            seconds = time.perf_counter() - start
+
+            record = self.stages.setdefault(
+                name, {"calls": 0, "seconds": 0.0, "max_seconds": 0.0}
+            )
+            record["calls"] += 1
+            record["seconds"] += seconds
+            record["max_seconds"] = max(record["max_seconds"], seconds)
+            record.update(info)
+            if resource is not None:
+                record["peak_rss_bytes"] = self.__peak_rss()
+            if self.trace_memory:
+                record["traced_peak_bytes"] = max(
+                    record.get("traced_peak_bytes", 0),
+                    self.__stop_trace(started_tracing),
+                )
+
+            for observer in self.observers:
+                observer(name, dict(record, last_seconds=seconds))
+
+    @contextmanager
+    def channel(self, channel, removed_states):
+        """
+        Records the wall time and memory of the removal of a channel, given
+        the number of states removed with it
+        """
+        if self.trace_memory:
+            started_tracing = self.__start_trace()
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            # The removal solves a system with the N_SS block of float64
+            info = {"solve_bytes": 8 * removed_states**2}
+            if self.trace_memory:
+                info["traced_peak_bytes"] = self.__stop_trace(
+                    started_tracing
+                )
+            self.add_channel(channel, seconds, removed_states, **info)
+
+    def __start_trace(self):
+        """
+        Starts measuring the traced peak of a stage or channel, and returns
+        whether tracemalloc had to be started for it
+        """
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        # Resetting the peak would lose that of the enclosing stage, so it
+        # is saved first
+        if self.__peaks:
+            peak = tracemalloc.get_traced_memory()[1]
+            self.__peaks[-1] = max(self.__peaks[-1], peak)
+        tracemalloc.reset_peak()
+        self.__peaks.append(0)
+
+        return started_tracing
+
+    def __stop_trace(self, started_tracing):
+        """
+        Returns the traced peak since the matching __start_trace, and stops
+        tracemalloc if it was started there
+        """
+        peak = max(self.__peaks.pop(), tracemalloc.get_traced_memory()[1])
+        # The enclosing stage peaked at least as high
+        if self.__peaks:
+            self.__peaks[-1] = max(self.__peaks[-1], peak)
+        if started_tracing:
+            tracemalloc.stop()
+
+        return peak
+
+    def __peak_rss(self):
+        """
+        Returns the peak resident memory of the process in bytes
+        """
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+
+    def add_channel(self, channel, seconds, removed_states, **info):
+        """
+        Records the removal of a channel, with any other measure of it
+        """
+        self.channels[channel] = dict(
+            info, seconds=seconds, removed_states=removed_states
+        )
+
+    def to_dict(self):
+        """
+        Returns the stages and channels as a dictionary that can be
+        serialised as JSON
+        """
+        return {
+            "stages": {k: dict(v) for k, v in self.stages.items()},
+            "channels": {k: dict(v) for k, v in self.channels.items()},
+        }
+
+    def to_records(self, prefix="markov_attribution"):
+        """
+        Returns a flat list of (metric name, value) pairs, such as
+        ('markov_attribution.solve.seconds', 0.2), for metrics pipelines
+        """
+        records = []
+        for name, record in self.stages.items():
+            for key, value in record.items():
+                if isinstance(value, (int, float)):
+                    records.append(
+                        ("{}.{}.{}".format(prefix, name, key), value)
+                    )
+        for channel, record in self.channels.items():
+            for key, value in record.items():
+                records.append(
+                    ("{}.channel.{}.{}".format(prefix, channel, key), value)
+                )
+
+        return records
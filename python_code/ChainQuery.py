@@ -0,0 +1,208 @@
+from collections import OrderedDict
+from functools import partial
+import threading
+
+from .MarkovDB import MarkovDB
+
+
+class ChainQuery:
+    """
+    What-if queries over a solved chain
+
+    ...
+
+    Holds a MarkovDB whose chain is solved once, when the object is
+    created, and answers conversion probabilities with any set of channels
+    removed. Each removal is a low-rank update of the solved chain (see
+    MarkovMatrix.get_removal_probability), so no matrix is built or
+    inverted again, and the most recent answers are kept in an LRU cache.
+
+    The queries can be run from several threads at once, as only the cache
+    is locked. The async methods run the queries in a thread pool, so
+    concurrent requests of an asyncio application do not block the event
+    loop or each other.
+
+    Parameters
+    ----------
+    db : MarkovDB
+        Database of the chain to query
+    max_cached : int
+        Maximum number of answers kept in the cache
+    max_workers : int, optional
+        Number of threads of the async methods (see ThreadPoolExecutor)
+
+    Atributes
+    ---------
+    full_probability : float
+        Probability to go from 'START' to 'CONVERSION'
+    hits, misses : int
+        Number of queries answered from the cache, or computed
+
+    Methods
+    -------
+    load(file, sparse, max_cached, max_workers)
+        Returns a ChainQuery over a MarkovDB stored with MarkovDB.save
+    get_probability(trans_state, abs_state)
+        Returns the probability to go from trans_state to abs_state
+    get_removal_probability(channels, trans_state, abs_state)
+        Same probability once the channels are removed
+    get_removal_effect(channels)
+        Relative drop of full_probability once the channels are removed
+    get_probability_async, get_removal_probability_async,
+    get_removal_effect_async
+        Coroutines that run the queries in the thread pool
+    clear()
+        Empties the cache
+    close()
+        Shuts the thread pool down
+    """
+
+    def __init__(self, db, max_cached=1024, max_workers=None):
+
+        self.db = db
+        self.max_cached = max_cached
+        self.max_workers = max_workers
+        self.hits = 0
+        self.misses = 0
+        self.__cache = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__executor = None
+
+        # Everything that is built on first use is built now, so the
+        # queries only read it
+        markov_matrix = db.markov_matrix
+        if not db.sparse and not db.lazy:
+            markov_matrix.n
+        self.full_probability = self.get_probability()
+
+    @classmethod
+    def load(cls, file, sparse=False, max_cached=1024, max_workers=None):
+        """
+        Returns a ChainQuery over the MarkovDB stored in a .npz file with
+        MarkovDB.save
+        """
+        return cls(
+            MarkovDB.load(file, sparse=sparse),
+            max_cached=max_cached,
+            max_workers=max_workers,
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __query(self, key, function, *args):
+        """
+        Returns the answer cached under key, or computes it with function
+        and caches it
+        """
+        with self.__lock:
+            if key in self.__cache:
+                self.__cache.move_to_end(key)
+                self.hits += 1
+                return self.__cache[key]
+
+        # Computed outside of the lock, so other queries are not blocked
+        answer = function(*args)
+
+        with self.__lock:
+            self.misses += 1
+            self.__cache[key] = answer
+            self.__cache.move_to_end(key)
+            while len(self.__cache) > self.max_cached:
+                self.__cache.popitem(last=False)
+
+        return answer
+
+    def get_probability(self, trans_state="START", abs_state="CONVERSION"):
+        """
+        Returns the probability to go from trans_state to abs_state
+        """
+        return self.__query(
+            ("probability", trans_state, abs_state),
+            self.db.get_probability,
+            trans_state,
+            abs_state,
+        )
+
+    def get_removal_probability(
+        self, channels, trans_state="START", abs_state="CONVERSION"
+    ):
+        """
+        Returns the probability to go from trans_state to abs_state once
+        every channel in channels is replaced by 'NULL'. The order of the
+        channels does not matter, so it is cached as a set
+        """
+        if isinstance(channels, str):
+            channels = [channels]
+        channels = frozenset(channels)
+
+        return self.__query(
+            ("removal", channels, trans_state, abs_state),
+            self.db.get_removal_probability,
+            trans_state,
+            abs_state,
+            sorted(channels),
+        )
+
+    def get_removal_effect(self, channels):
+        """
+        Returns the relative drop of the probability to go from 'START' to
+        'CONVERSION' once every channel in channels is removed
+        """
+        if self.full_probability == 0:
+            return 0.0
+
+        removal = self.get_removal_probability(channels)
+
+        return 1 - removal / self.full_probability
+
+    async def __run(self, function, *args):
+        """
+        Runs a query in the thread pool, which is started on first use.
+        asyncio and the pool are only imported then, so importing the
+        package stays cheap
+        """
+        import asyncio
+
+        if self.__executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            self.__executor = ThreadPoolExecutor(self.max_workers)
+        loop = asyncio.get_running_loop()
+
+        return await loop.run_in_executor(
+            self.__executor, partial(function, *args)
+        )
+
+    async def get_probability_async(
+        self, trans_state="START", abs_state="CONVERSION"
+    ):
+        return await self.__run(self.get_probability, trans_state, abs_state)
+
+    async def get_removal_probability_async(
+        self, channels, trans_state="START", abs_state="CONVERSION"
+    ):
+        return await self.__run(
+            self.get_removal_probability, channels, trans_state, abs_state
+        )
+
+    async def get_removal_effect_async(self, channels):
+        return await self.__run(self.get_removal_effect, channels)
+
+    def clear(self):
+        """
+        Empties the cache of answers
+        """
+        with self.__lock:
+            self.__cache.clear()
+
+    def close(self):
+        """
+        Shuts the thread pool of the async methods down
+        """
+        if self.__executor is not None:
+            self.__executor.shutdown()
+            self.__executor = None
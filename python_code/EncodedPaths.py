@@ -0,0 +1,496 @@
+from collections import defaultdict
+from itertools import chain
+import itertools
+
+import numpy as np
+
+
+def pack_states(channel_codes, base):
+    """
+    Packs tuples of channel codes (oldest first, one tuple per row of
+    channel_codes) into integer keys, using every code as a digit in the
+    given base. Shorter tuples are padded on the left with 0
+    """
+    channel_codes = np.atleast_2d(channel_codes)
+    order = channel_codes.shape[1]
+    if base ** order > np.iinfo(np.int64).max:
+        raise ValueError(
+            "Too many channels ({}) to pack states of order {}".format(
+                base - 2, order
+            )
+        )
+    powers = base ** np.arange(order - 1, -1, -1, dtype=np.int64)
+
+    return channel_codes @ powers
+
+
+def unpack_states(keys, base, order):
+    """
+    Returns the channel codes (oldest first) of each packed state key, one
+    row per key
+    """
+    powers = base ** np.arange(order - 1, -1, -1, dtype=np.int64)
+
+    return (np.asarray(keys)[:, None] // powers) % base
+
+
+def _is_missing(value):
+    """
+    Returns True for None, NaN and pandas.NA
+    """
+    try:
+        return value is None or bool(value != value)
+    except TypeError:
+        # pandas.NA cannot be converted to bool
+        return True
+
+
+def sort_segments(segments):
+    """
+    Returns the segments (values or tuples of values of the group fields)
+    sorted, with the missing values, which are None, after the others
+    """
+
+    def key(segment):
+        fields = segment if isinstance(segment, tuple) else (segment,)
+        return tuple(
+            (field is None, "" if field is None else field)
+            for field in fields
+        )
+
+    return sorted(segments, key=key)
+
+
+class EncodedPaths:
+    """
+    Integer encoded customer journeys
+
+    ...
+
+    Rows are first aggregated by path and outcome (converted or not), so
+    repeated paths are only handled once and carry the number of journeys
+    they stand for. The distinct paths are tokenised once and every
+    touchpoint is replaced by the integer of its state, so the transitions
+    of the whole dataset can be counted with array operations instead of
+    walking each path.
+
+    States are numbered as in MarkovDB: 0 is 'START', 1..C are the sorted
+    channels, C + 1 is 'NULL' and C + 2 is 'CONVERSION'.
+
+    Parameters
+    ----------
+    dataset : list of dict, pandas dataframe or pyarrow table
+        Each row has to have the path, conversion and value fields
+    var_path : str
+        Name of the path field
+    var_conv : str
+        Name of the conversion field
+    var_value : str
+        Name of the value field
+    separator : str
+        The path separator for each column (' > ' for example) that
+        indicates the customer journey
+    var_count : str, optional
+        Name of the field with the number of journeys each row stands for,
+        for datasets that are already aggregated. The conversion field is
+        then the number of those journeys that converted, and the others
+        end in 'NULL'. Rows with no journeys are dropped. Each row counts
+        once if it is not given
+    var_group : str or list of str, optional
+        Name of the field, or fields, that split the journeys in segments.
+        If given, rows are also aggregated by segment, so the same path in
+        two segments is kept twice
+
+    Atributes
+    ---------
+    channels : list of str
+        Sorted list of the channels found in the paths, without the
+        'START', 'NULL' and 'CONVERSION' states
+    codes : numpy array
+        State of every touchpoint, with all the paths concatenated
+    lengths : numpy array
+        Number of touchpoints of each distinct path
+    counts : numpy array
+        Number of journeys that followed each distinct path
+    conversions : numpy array
+        Total conversions of each distinct path
+    values : numpy array
+        Total value of each distinct path
+    segments : list
+        Sorted values of var_group (tuples if it is a list), or None.
+        Missing values are None and sorted last (see sort_segments)
+    groups : numpy array
+        Position in segments of the segment of each distinct path, or None
+    """
+
+    def __init__(
+        self,
+        dataset,
+        var_path,
+        var_conv,
+        var_value,
+        separator,
+        var_count=None,
+        var_group=None,
+    ):
+
+        self.var_path = var_path
+        self.var_conv = var_conv
+        self.var_value = var_value
+        self.var_count = var_count
+        self.separator = separator
+        self.var_group = var_group
+        if var_group is None:
+            self.__group_fields = []
+        elif isinstance(var_group, str):
+            self.__group_fields = [var_group]
+        else:
+            self.__group_fields = list(var_group)
+        self.segments = None
+        self.groups = None
+
+        if isinstance(dataset, list):
+            tokens = self.__tokenise_records(dataset)
+        elif hasattr(dataset, "schema") and hasattr(dataset, "column"):
+            tokens = self.__tokenise_arrow(dataset)
+        else:
+            tokens = self.__tokenise_dataframe(dataset)
+
+        self.channels, self.codes, self.lengths = self.__encode(*tokens)
+        if var_count is not None:
+            self.__split_conversions()
+        self.__states = {}
+
+    def __tokenise_records(self, dataset):
+        """
+        Aggregates a list of dictionaries by path and outcome, then splits
+        the distinct paths
+        """
+        fields = self.__group_fields
+        groups = {}
+        for row in dataset:
+            key = (row[self.var_path] or "", row[self.var_conv] > 0)
+            if fields:
+                key += tuple(row[field] for field in fields)
+            count = 1 if self.var_count is None else row[self.var_count]
+            group = groups.setdefault(key, [0, 0, 0])
+            group[0] += count
+            group[1] += row[self.var_conv]
+            group[2] += row[self.var_value]
+        # Paths that no journey followed would add channels without
+        # transitions
+        groups = {key: group for key, group in groups.items() if group[0] > 0}
+
+        aggregated = list(zip(*groups.values())) or [(), (), ()]
+        self.counts = np.array(aggregated[0], dtype=float)
+        self.conversions = np.array(aggregated[1])
+        self.values = np.array(aggregated[2])
+
+        if fields:
+            self.__encode_groups([key[2:] for key in groups])
+
+        paths = [key[0].split(self.separator) for key in groups]
+        lengths = np.fromiter(map(len, paths), dtype=np.int64, count=len(paths))
+
+        # Tokens are numbered by first appearance with a hash lookup, only
+        # the distinct ones are sorted afterwards (see __encode)
+        vocabulary = defaultdict(itertools.count().__next__)
+        inverse = np.fromiter(
+            map(vocabulary.__getitem__, chain.from_iterable(paths)),
+            dtype=np.int64,
+            count=int(lengths.sum()),
+        )
+        uniques = np.empty(len(vocabulary), dtype=object)
+        uniques[:] = list(vocabulary)
+
+        return uniques, inverse, lengths
+
+    def __tokenise_dataframe(self, dataset):
+        """
+        Aggregates a pandas dataframe by path and outcome, then splits
+        the distinct paths
+        """
+        import pandas as pd
+
+        if self.var_count is None:
+            count = 1.0
+        else:
+            count = dataset[self.var_count].to_numpy(dtype=float)
+
+        fields = self.__group_fields
+        columns = {
+            "path": dataset[self.var_path].fillna("").to_numpy(),
+            "converted": (dataset[self.var_conv] > 0).to_numpy(),
+            "count": count,
+            "conversions": dataset[self.var_conv].to_numpy(),
+            "values": dataset[self.var_value].to_numpy(),
+        }
+        keys = ["path", "converted"]
+        for i, field in enumerate(fields):
+            columns["group_{}".format(i)] = dataset[field].to_numpy()
+            keys.append("group_{}".format(i))
+
+        aggregated = (
+            pd.DataFrame(columns)
+            .groupby(keys, sort=False, dropna=False)
+            .sum()
+            .reset_index()
+        )
+        aggregated = aggregated[aggregated["count"] > 0]
+        if fields:
+            self.__encode_groups(
+                zip(*(aggregated[key].tolist() for key in keys[2:]))
+            )
+
+        self.counts = aggregated["count"].to_numpy(dtype=float)
+        self.conversions = aggregated["conversions"].to_numpy()
+        self.values = aggregated["values"].to_numpy()
+
+        paths = aggregated["path"].str.split(self.separator, regex=False)
+        lengths = paths.str.len().to_numpy(dtype=np.int64)
+        inverse, uniques = pd.factorize(paths.explode(), use_na_sentinel=False)
+
+        return np.asarray(uniques, dtype=object), inverse, lengths
+
+    def __tokenise_arrow(self, dataset):
+        """
+        Aggregates a pyarrow table by path and outcome, then splits the
+        distinct paths
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        if self.var_count is None:
+            count = pa.repeat(1.0, dataset.num_rows)
+        else:
+            count = pc.cast(dataset.column(self.var_count), pa.float64())
+
+        fields = self.__group_fields
+        conversions = dataset.column(self.var_conv)
+        columns = {
+            "path": pc.fill_null(dataset.column(self.var_path), ""),
+            "converted": pc.greater(conversions, 0),
+            "count": count,
+            "conversions": conversions,
+            "values": dataset.column(self.var_value),
+        }
+        keys = ["path", "converted"]
+        for i, field in enumerate(fields):
+            columns["group_{}".format(i)] = dataset.column(field)
+            keys.append("group_{}".format(i))
+
+        aggregated = (
+            pa.table(columns)
+            .group_by(keys, use_threads=False)
+            .aggregate(
+                [("count", "sum"), ("conversions", "sum"), ("values", "sum")]
+            )
+        )
+        aggregated = aggregated.filter(
+            pc.greater(aggregated.column("count_sum"), 0)
+        )
+        if fields:
+            self.__encode_groups(
+                zip(
+                    *(aggregated.column(key).to_pylist() for key in keys[2:])
+                )
+            )
+
+        self.counts = aggregated.column("count_sum").to_numpy()
+        self.conversions = aggregated.column("conversions_sum").to_numpy()
+        self.values = aggregated.column("values_sum").to_numpy()
+
+        paths = pc.split_pattern(aggregated.column("path"), self.separator)
+        lengths = pc.list_value_length(paths).to_numpy().astype(np.int64)
+        tokens = pc.dictionary_encode(
+            pc.list_flatten(paths).combine_chunks()
+        )
+
+        return (
+            np.asarray(tokens.dictionary.to_pylist(), dtype=object),
+            tokens.indices.to_numpy(),
+            lengths,
+        )
+
+    def __encode_groups(self, keys):
+        """
+        Numbers the segments of the distinct paths in sorted order, given
+        the tuple of group fields of each one
+        """
+        # NaN is not equal to itself, so every missing value becomes None
+        keys = [
+            tuple(None if _is_missing(field) else field for field in key)
+            for key in keys
+        ]
+        if isinstance(self.var_group, str):
+            keys = [key[0] for key in keys]
+
+        self.segments = sort_segments(set(keys))
+        lookup = {segment: i for i, segment in enumerate(self.segments)}
+        self.groups = np.fromiter(
+            (lookup[key] for key in keys), dtype=np.int64, count=len(keys)
+        )
+
+    def __split_conversions(self):
+        """
+        Splits the aggregated paths that stand for converted and not
+        converted journeys (0 < conversions < count) into a converted path
+        with the conversions and the value, and a copy of it that ends in
+        'NULL' with the rest of the journeys
+        """
+        if (self.conversions > self.counts).any():
+            raise ValueError(
+                "A row has more conversions than journeys ({})".format(
+                    self.var_count
+                )
+            )
+        mixed = np.flatnonzero(
+            (self.conversions > 0) & (self.conversions < self.counts)
+        )
+        if not len(mixed):
+            return
+
+        # Touchpoints of the mixed paths, appended after all the paths
+        starts = np.cumsum(self.lengths) - self.lengths
+        lengths = self.lengths[mixed]
+        offsets = np.arange(lengths.sum()) - np.repeat(
+            np.cumsum(lengths) - lengths, lengths
+        )
+        touchpoints = np.repeat(starts[mixed], lengths) + offsets
+
+        self.codes = np.concatenate([self.codes, self.codes[touchpoints]])
+        self.lengths = np.concatenate([self.lengths, lengths])
+        self.counts = np.concatenate(
+            [self.counts, self.counts[mixed] - self.conversions[mixed]]
+        )
+        self.counts[mixed] = self.conversions[mixed]
+        self.conversions = np.concatenate(
+            [self.conversions, np.zeros(len(mixed), self.conversions.dtype)]
+        )
+        self.values = np.concatenate(
+            [self.values, np.zeros(len(mixed), self.values.dtype)]
+        )
+        if self.groups is not None:
+            self.groups = np.concatenate([self.groups, self.groups[mixed]])
+
+    def __encode(self, uniques, inverse, lengths):
+        """
+        Maps the distinct tokens to sorted states. Empty tokens are
+        dropped and 'NULL' tokens are mapped to the 'NULL' state
+        """
+        is_channel = (uniques != "") & (uniques != "NULL")
+        channel_idx = np.flatnonzero(is_channel)
+        channel_idx = channel_idx[np.argsort(uniques[channel_idx], kind="stable")]
+        channels = uniques[channel_idx].tolist()
+
+        lookup = np.full(len(uniques), -1, dtype=np.int64)
+        lookup[channel_idx] = np.arange(1, len(channels) + 1)
+        lookup[uniques == "NULL"] = len(channels) + 1
+
+        codes = lookup[inverse]
+        keep = codes >= 0
+        if not keep.all():
+            rows = np.repeat(np.arange(len(lengths)), lengths)
+            lengths = np.bincount(rows[keep], minlength=len(lengths))
+            codes = codes[keep]
+
+        return channels, codes, lengths
+
+    def pack(self, channel_codes):
+        """
+        Packs tuples of channel codes into the integer keys used for higher
+        order states (see pack_states)
+        """
+        return pack_states(channel_codes, len(self.channels) + 2)
+
+    def unpack(self, keys, order):
+        """
+        Returns the channel codes (oldest first) of each packed state key,
+        one row per key
+        """
+        return unpack_states(keys, len(self.channels) + 2, order)
+
+    def get_states(self, order=1):
+        """
+        Returns the sorted keys of the states of the chain of the given
+        order, besides 'START', 'NULL' and 'CONVERSION', and the state
+        reached at every touchpoint.
+
+        A state of order k is the tuple of the last k channels of the path,
+        or fewer at its beginning or right after a 'NULL' touchpoint,
+        packed into an integer (see pack). The states are numbered from 1
+        in the order of their keys, followed by 'NULL' and 'CONVERSION'.
+        For order 1 the keys are the channel codes
+        """
+        if order in self.__states:
+            return self.__states[order]
+
+        null = len(self.channels) + 1
+
+        if order == 1:
+            keys = np.arange(1, null)
+            states = self.codes
+        else:
+            is_null = self.codes == null
+
+            # The history of a touchpoint starts at the beginning of its
+            # path or right after the last 'NULL' touchpoint
+            index = np.arange(len(self.codes))
+            history_starts = np.zeros(len(self.codes), dtype=np.int64)
+            after_null = np.flatnonzero(is_null[:-1]) + 1
+            history_starts[after_null] = after_null
+            path_starts = (np.cumsum(self.lengths) - self.lengths)[
+                self.lengths > 0
+            ]
+            history_starts[path_starts] = path_starts
+            positions = index - np.maximum.accumulate(history_starts)
+            history = np.zeros((len(self.codes), order), dtype=np.int64)
+            for lag in range(order):
+                history[lag:, order - 1 - lag] = self.codes[
+                    : len(self.codes) - lag
+                ]
+                history[positions < lag, order - 1 - lag] = 0
+
+            keys, inverse = np.unique(
+                self.pack(history[~is_null]), return_inverse=True
+            )
+            states = np.full(len(self.codes), len(keys) + 1)
+            states[~is_null] = inverse + 1
+
+        self.__states[order] = keys, states
+
+        return keys, states
+
+    def get_transitions(self, order=1):
+        """
+        Returns three arrays with the origin state, the destination state
+        and the distinct path of every transition in the chain of the given
+        order (see get_states). Each path goes from 'START' through its
+        touchpoints to 'CONVERSION' if it had a conversion, or to 'NULL'
+        otherwise. Nothing leaves an absorbing state
+        """
+        keys, states = self.get_states(order)
+        null = len(keys) + 1
+        conversion = len(keys) + 2
+
+        seq_lengths = self.lengths + 2
+        ends = np.cumsum(seq_lengths)
+        starts = ends - seq_lengths
+
+        seq = np.empty(int(seq_lengths.sum()), dtype=np.int64)
+        touchpoints = np.ones(len(seq), dtype=bool)
+        touchpoints[starts] = False
+        touchpoints[ends - 1] = False
+        seq[touchpoints] = states
+        seq[starts] = 0
+        seq[ends - 1] = np.where(self.conversions > 0, conversion, null)
+
+        rows = np.repeat(np.arange(len(self.lengths)), seq_lengths)
+        from_states = seq[:-1]
+        to_states = seq[1:]
+
+        # The last state of each path is absorbing, so this also drops
+        # the pairs that would join two consecutive paths
+        valid = from_states < null
+
+        return from_states[valid], to_states[valid], rows[:-1][valid]
@@ -1,7 +1,16 @@
-from copy import deepcopy
-import pandas as pd
+from math import factorial
+
+import numpy as np
+from .AttributionStats import stage
 from .MarkovDB import MarkovDB
 
+# Shapley values are computed exactly up to this number of channels, and
+# estimated from sampled permutations above it
+MAX_EXACT_CHANNELS = 12
+DEFAULT_SAMPLES = 1000
+# Maximum number of coalition values kept while sampling permutations
+MAX_CACHED_COALITIONS = 2**16
+
 
 class MarkovAttribution:
     """
@@ -11,14 +20,68 @@ class MarkovAttribution:
 
     Parameters
     ----------
-    dataset : list of dict
+    dataset : list of dict, pandas dataframe, pyarrow table or iterator
         Each dictionary has to have the 'conversion', 'value' and
         'path' keys. The value for the 'conversion' key should be
         an integer 1 or 0, denoting if there was a conversion. The
-        value
+        value. An iterator of chunks is read one chunk at a time (see
+        MarkovDB)
     separator : str
         The path separator for each column (' > ' for example) that
         indicates the customer journey
+    sparse : bool
+        If True, the transition matrix is kept in sparse (CSR) form and
+        solved with a sparse factorisation (see MarkovDB)
+    var_count : str, optional
+        Name of the field with the number of journeys each row stands for,
+        for datasets that are already aggregated by path (see MarkovDB)
+    n_jobs : int
+        Number of worker processes used to compute the removal effects.
+        The solved chain is sent once to the workers through shared
+        memory (see RemovalPool)
+    order : int
+        Order of the Markov chain. The removal effect of a channel knocks
+        out every higher order state that contains it (see MarkovDB)
+    stats : AttributionStats, optional
+        If given, the time and memory of each stage of the attribution and
+        of the removal of each channel are recorded in it
+    cache : ResultCache, optional
+        If given, the results are looked up in it by the fingerprint of
+        the transition counts and the order of the chain, and stored in it
+        when they are not found. The chain is then only built and solved
+        on a cache miss
+    method : str
+        'removal' splits the conversions by the removal effect of each
+        channel. 'shapley' splits them by the Shapley value of each
+        channel, where the value of a coalition of channels is the
+        probability of conversion when only those channels are kept
+    samples : int, optional
+        Number of sampled permutations to estimate the Shapley values. If
+        None, they are computed exactly when there are up to
+        MAX_EXACT_CHANNELS channels, and with DEFAULT_SAMPLES permutations
+        otherwise
+    seed : int, optional
+        Seed of the sampled permutations and of the bootstrap replicates
+    bootstrap : int
+        Number of bootstrap replicates of the journeys. If it is not 0,
+        df_info has one more column for each quantile of the conversions
+        and value of each channel over the replicates (see
+        MarkovDB.get_bootstrap_probabilities). Only with method='removal'
+    quantiles : tuple of float
+        Quantiles of the bootstrap replicates reported in df_info, in
+        columns such as 'total_conversion_q0.025'
+    min_count : int, optional
+        Channels visited fewer times are merged into buckets, which are
+        attributed as channels (see MarkovDB)
+    top_k : int, optional
+        Only the top_k most visited channels are kept, the others are
+        merged into buckets
+    groups : dict, optional
+        Bucket names and regular expressions for the pruned channels,
+        which go to 'OTHER' when they match none
+    lazy : bool
+        If True, the chain is only solved for the states that the removals
+        need instead of inverting it whole (see MarkovDB)
 
     Atributes
     ---------
@@ -26,6 +89,21 @@ class MarkovAttribution:
         MarkovDB object created from the base dataset
     full_probability : float
         Probability to go from the channel 'START' to 'CONVERSION'
+    removal_effects : dict
+        Relative drop of full_probability when each channel is removed,
+        with method='removal'
+    shapley_values : dict
+        Shapley value of each channel, with method='shapley'. They add up
+        to full_probability minus the probability with no channels
+    bootstrap_conversions : numpy array
+        Conversions attributed to each channel (columns) in each bootstrap
+        replicate (rows), if bootstrap is not 0
+    bucketed_mass : float
+        Fraction of the transition counts from or to a state with a
+        pruned channel
+    df_info : pandas dataframe
+        Conversions and value attributed to each channel. pandas is only
+        imported when it is first accessed
     channels : list of str
         Sorted list with the different channel possibilities of
         the customer journey, including the 'START', 'NULL' and
@@ -37,62 +115,340 @@ class MarkovAttribution:
         a channel is removed
     """
 
-    def __init__(self, dataset, var_path, var_conv, var_value, separator):
+    def __init__(
+        self,
+        dataset,
+        var_path,
+        var_conv,
+        var_value,
+        separator,
+        sparse=False,
+        var_count=None,
+        n_jobs=1,
+        order=1,
+        stats=None,
+        cache=None,
+        method="removal",
+        samples=None,
+        seed=None,
+        bootstrap=0,
+        quantiles=(0.025, 0.975),
+        min_count=None,
+        top_k=None,
+        groups=None,
+        lazy=False,
+    ):
 
-        self.dataset = dataset
         self.var_path = var_path
         self.var_conv = var_conv
         self.var_value = var_value
         self.separator = separator
-        self.db = MarkovDB(dataset, var_path, var_conv, var_value, separator)
-        self.full_probability = self.db.get_probability("START", "CONVERSION")
-        self.channels = self.db.unique_channels
-        self.df_info = self.__get_df()
+        self.sparse = sparse
+        self.lazy = lazy
+        self.var_count = var_count
+        self.n_jobs = n_jobs
+        self.order = order
+        self.stats = stats
+        self.cache = cache
+        self.method = method
+        self.samples = samples
+        self.seed = seed
+        self.bootstrap = bootstrap
+        self.quantiles = quantiles
+        self.db = MarkovDB(
+            dataset,
+            var_path,
+            var_conv,
+            var_value,
+            separator,
+            sparse=sparse,
+            lazy=lazy,
+            var_count=var_count,
+            order=order,
+            stats=stats,
+            keep_paths=bootstrap > 0,
+            min_count=min_count,
+            top_k=top_k,
+            groups=groups,
+        )
+        self.__attribute()
+
+    @classmethod
+    def from_db(
+        cls,
+        db,
+        n_jobs=1,
+        cache=None,
+        method="removal",
+        samples=None,
+        seed=None,
+        bootstrap=0,
+        quantiles=(0.025, 0.975),
+    ):
+        """
+        Returns the attribution of an already built MarkovDB, for instance
+        one filled chunk by chunk with MarkovDB.partial_fit. The stages
+        are recorded in the stats of the MarkovDB, the channels are pruned
+        as set in it, and the bootstrap needs a MarkovDB built with
+        keep_paths=True
+        """
+        attribution = cls.__new__(cls)
+        attribution.var_path = db.var_path
+        attribution.var_conv = db.var_conv
+        attribution.var_value = db.var_value
+        attribution.separator = db.separator
+        attribution.sparse = db.sparse
+        attribution.lazy = db.lazy
+        attribution.var_count = db.var_count
+        attribution.n_jobs = n_jobs
+        attribution.order = db.order
+        attribution.stats = db.stats
+        attribution.cache = cache
+        attribution.method = method
+        attribution.samples = samples
+        attribution.seed = seed
+        attribution.bootstrap = bootstrap
+        attribution.quantiles = quantiles
+        attribution.db = db
+        attribution.__attribute()
+
+        return attribution
 
-    def __rm(self, channel):
+    def __attribute(self):
         """
-        Returns a copy of the original data, with channel equal to NULL
+        Computes the attribution from self.db, or reads it from the cache
         """
-        new_dataset = deepcopy(self.dataset)
-        for row in new_dataset:
-            try:
-                row[self.var_path] = row[self.var_path].replace(
-                    channel, "NULL"
+        if self.method not in ["removal", "shapley"]:
+            raise ValueError("Unknown method: {}".format(self.method))
+        if self.bootstrap and self.method != "removal":
+            raise ValueError("The bootstrap needs method='removal'")
+        self.bootstrap_conversions = None
+
+        key = None
+        if self.cache is not None:
+            params = {"order": self.order, "method": self.method}
+            if self.db.min_count is not None or self.db.top_k is not None:
+                params.update(
+                    min_count=self.db.min_count,
+                    top_k=self.db.top_k,
+                    groups=self.db.groups,
+                )
+            if self.method == "shapley":
+                params.update(samples=self.samples, seed=self.seed)
+            if self.bootstrap:
+                params.update(
+                    seed=self.seed,
+                    bootstrap=self.bootstrap,
+                    quantiles=list(self.quantiles),
                 )
-            except Exception:
-                row[self.var_path] = row[self.var_path]
-        return new_dataset
+            with stage(self.stats, "cache"):
+                key = self.cache.get_key(self.db.counts, **params)
+                result = self.cache.get(key)
+            if result is not None:
+                self.full_probability = result["full_probability"]
+                self.__effects = result["effects"]
+                if self.method == "removal":
+                    self.removal_effects = result["effects"]
+                else:
+                    self.shapley_values = result["effects"]
+                self.channels = result["channels"]
+                self.__info = result["info"]
+                self.__df_info = None
+                self.bootstrap_conversions = result["bootstrap_conversions"]
+                self.bucketed_mass = result.get("bucketed_mass", 0.0)
+                return
+
+        channels = self.db.unique_channels
+        with stage(self.stats, "full_probability"):
+            self.full_probability = self.db.get_probability(
+                "START", "CONVERSION"
+            )
+        self.channels = channels
+        self.bucketed_mass = self.db.bucketed_mass
+        with stage(self.stats, "attribution", channels=len(channels) - 3):
+            self.__info = self.__get_info()
+            self.__df_info = None
+        if self.bootstrap:
+            with stage(self.stats, "bootstrap", replicates=self.bootstrap):
+                self.__add_bootstrap_quantiles()
 
-    def __removal_effect(self, channel):
+        if key is not None:
+            self.cache.put(
+                key,
+                {
+                    "full_probability": self.full_probability,
+                    "effects": self.__effects,
+                    "channels": self.channels,
+                    "info": self.__info,
+                    "bootstrap_conversions": self.bootstrap_conversions,
+                    "bucketed_mass": self.bucketed_mass,
+                },
+            )
+
+    def __removal_effects(self, channels):
         """
-        Returns a dictionary that has information on the effect of removing
-        a channel on the dataset
+        Returns a dictionary with the effect of removing each channel
+        on the dataset
+
+        The removals are computed on the transition matrix already built
+        in self.db, so the dataset is never copied or parsed again
         """
 
-        removal_ds = self.__rm(channel)
-        removal_db = MarkovDB(
-            removal_ds,
-            self.var_path,
-            self.var_conv,
-            self.var_value,
-            self.separator,
+        removal_probs = self.db.get_removal_probabilities(
+            "START",
+            "CONVERSION",
+            [[channel] for channel in channels],
+            n_jobs=self.n_jobs,
         )
-        removal_prob = removal_db.get_probability("START", "CONVERSION")
-        if self.full_probability == 0:
-            removal_eff = 0
+
+        effect = {}
+        for channel, removal_prob in zip(channels, removal_probs):
+            if self.full_probability == 0:
+                effect[channel] = 0
+            else:
+                effect[channel] = 1 - (removal_prob / self.full_probability)
+
+        return effect
+
+    def __add_bootstrap_quantiles(self):
+        """
+        Adds to df_info the quantiles of the conversions and value of each
+        channel over the bootstrap replicates
+        """
+        channels = self.__info["channel_name"]
+        (
+            probabilities,
+            removal_probabilities,
+            conversions,
+            values,
+        ) = self.db.get_bootstrap_probabilities(
+            "START",
+            "CONVERSION",
+            [[channel] for channel in channels],
+            self.bootstrap,
+            seed=self.seed,
+        )
+
+        probabilities = probabilities[:, None]
+        effects = np.divide(
+            probabilities - removal_probabilities,
+            probabilities,
+            out=np.zeros_like(removal_probabilities),
+            where=probabilities != 0,
+        )
+        weights = effects / effects.sum(axis=1, keepdims=True)
+        self.bootstrap_conversions = weights * conversions[:, None]
+        bootstrap_values = weights * values[:, None]
+
+        for q in self.quantiles:
+            self.__info["total_conversion_q{:g}".format(q)] = np.quantile(
+                self.bootstrap_conversions, q, axis=0
+            )
+        for q in self.quantiles:
+            self.__info["total_conversion_value_q{:g}".format(q)] = (
+                np.quantile(bootstrap_values, q, axis=0)
+            )
+
+    def __shapley_values(self, channels):
+        """
+        Returns a dictionary with the Shapley value of each channel
+        """
+        num_channels = len(channels)
+
+        if self.samples is None and num_channels <= MAX_EXACT_CHANNELS:
+            with stage(self.stats, "shapley", coalitions=2**num_channels):
+                values = self.__exact_shapley_values(channels)
         else:
-            removal_eff = 1 - (removal_prob / self.full_probability)
+            samples = self.samples or DEFAULT_SAMPLES
+            with stage(self.stats, "shapley", permutations=samples):
+                values = self.__sampled_shapley_values(channels, samples)
+
+        return dict(zip(channels, values.tolist()))
+
+    def __exact_shapley_values(self, channels):
+        """
+        Returns the Shapley values of the channels, computed from the value
+        of every coalition. Each coalition is solved once, as the removal
+        of the channels outside of it, and reused for every channel
+        """
+        num_channels = len(channels)
+        masks = np.arange(2**num_channels)
 
-        return removal_eff
+        complements = [
+            [c for i, c in enumerate(channels) if not mask >> i & 1]
+            for mask in masks.tolist()
+        ]
+        values = np.array(
+            self.db.get_removal_probabilities(
+                "START", "CONVERSION", complements, n_jobs=self.n_jobs
+            )
+        )
+
+        sizes = np.array([bin(mask).count("1") for mask in masks.tolist()])
+        weights = np.array(
+            [
+                factorial(size) * factorial(num_channels - size - 1)
+                for size in range(num_channels)
+            ]
+        ) / factorial(num_channels)
 
-    def __get_df(self):
+        shapley_values = np.zeros(num_channels)
+        for i in range(num_channels):
+            without = masks[(masks >> i & 1) == 0]
+            marginal = values[without | 1 << i] - values[without]
+            shapley_values[i] = weights[sizes[without]] @ marginal
+
+        return shapley_values
+
+    def __sampled_shapley_values(self, channels, samples):
+        """
+        Returns the Shapley values of the channels, estimated as the mean
+        marginal contribution of each channel over random permutations.
+        The values of all the coalitions along a permutation are solved in
+        a single sequence of removals, and kept to be reused by the other
+        permutations
+        """
+        num_channels = len(channels)
+        rng = np.random.default_rng(self.seed)
+        coalitions = {}
+
+        shapley_values = np.zeros(num_channels)
+        for _ in range(samples):
+            permutation = rng.permutation(num_channels)
+
+            masks = [0]
+            for i in permutation.tolist():
+                masks.append(masks[-1] | 1 << i)
+            values = [coalitions.get(mask) for mask in masks]
+
+            if None in values:
+                values = self.db.get_permutation_probabilities(
+                    "START",
+                    "CONVERSION",
+                    [channels[i] for i in permutation],
+                )
+                if len(coalitions) < MAX_CACHED_COALITIONS:
+                    coalitions.update(zip(masks, values))
+
+            shapley_values[permutation] += np.diff(values)
+
+        return shapley_values / samples
+
+    @property
+    def df_info(self):
+        # pandas is only imported when the dataframe is first requested
+        if self.__df_info is None:
+            import pandas as pd
+
+            self.__df_info = pd.DataFrame(data=self.__info)
+        return self.__df_info
+
+    def __get_info(self):
         """
         Returns a dictionary that assess the impact on the conversion if
         a channel is removed
         """
 
-        effect = {}
-        cumulative = 0
         total_conversions = self.db.total_conversions
         total_value = self.db.total_value
 
@@ -105,9 +461,14 @@ class MarkovAttribution:
             for i in self.channels
             if i not in ["START", "CONVERSION", "NULL"]
         ]
-        for channel in channels_temp:
-            effect[channel] = self.__removal_effect(channel)
-            cumulative += effect[channel]
+        if self.method == "removal":
+            effect = self.__removal_effects(channels_temp)
+            self.removal_effects = effect
+        else:
+            effect = self.__shapley_values(channels_temp)
+            self.shapley_values = effect
+        self.__effects = effect
+        cumulative = sum(effect.values())
         for channel in channels_temp:
             weighted_effect_channel = effect[channel] / cumulative
             total_conversions_channel = (
@@ -127,4 +488,4 @@ class MarkovAttribution:
             "total_conversion_value": total_conversion_value_list,
         }
 
-        return pd.DataFrame(data=d)
+        return d
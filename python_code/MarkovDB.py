@@ -1,7 +1,27 @@
-from numpy import matrix, identity, subtract, matmul, zeros
-import pandas as pd
+from collections.abc import Iterator
+from contextlib import nullcontext
 
+from numpy import (
+    arange,
+    asarray,
+    bincount,
+    concatenate,
+    empty,
+    flatnonzero,
+    identity,
+    int64,
+    isin,
+    ones,
+    searchsorted,
+)
+from numpy.linalg import inv, solve
+from numpy.random import default_rng
+
+from .AttributionStats import stage
+from .EncodedPaths import EncodedPaths, pack_states, unpack_states
 from .MarkovMatrix import MarkovMatrix
+from .RandomWalks import RandomWalks
+from .TransitionCounts import TransitionCounts
 
 
 class MarkovDB:
@@ -12,20 +32,59 @@ class MarkovDB:
 
     Parameters
     ----------
-    dataset : list of dict
+    dataset : list of dict, pandas dataframe, pyarrow table or iterator
         Each dictionary has to have the 'conversion', 'value' and
         'path' keys. The value for the 'conversion' key should be
         an integer 1 or 0, denoting if there was a conversion. The
-        value
+        value. Dataframes and tables are tokenised column-wise without
+        going through Python dictionaries. An iterator of any of those
+        (a chunked CSV reader, Parquet record batches, a generator) is
+        read one chunk at a time, and None starts an empty database to
+        be filled with partial_fit
     separator : str
         The path separator for each column (' > ' for example) that
         indicates the customer journey
-
+    sparse : bool
+        If True, the transition matrix is stored as a scipy CSR matrix and
+        the chain is solved with a sparse factorisation. Useful when there
+        are many states with only a few outgoing transitions each
+    lazy : bool
+        If True, the MarkovMatrix only solves for the states that are
+        queried instead of computing its fundamental matrix upfront. In
+        dense mode the removals only solve for the states they remove
+        (see MarkovMatrix.prepare_removals), unless n_jobs is not 1
+    var_count : str, optional
+        Name of the field with the number of journeys each row stands for,
+        for datasets that are already aggregated by path. Rows with the
+        same path and outcome are always aggregated before building the
+        chain, so each row counts once if it is not given
+    order : int
+        Order of the Markov chain. With order k each state is the tuple of
+        the last k channels of the path, stored as a packed integer (see
+        EncodedPaths.pack). 'START', 'NULL' and 'CONVERSION' are kept as
+        single states
+    stats : AttributionStats, optional
+        If given, the time and memory of each stage (parse, count, matrix,
+        solve, removal) and of the removal of each channel are recorded in
+        it
+    keep_paths : bool
+        If True, the encoded unique paths of every chunk are kept next to
+        the counts, as needed by get_bootstrap_probabilities
+    min_count : int, optional
+        Channels visited fewer times are merged into buckets before the
+        chain is built (see TransitionCounts.prune)
+    top_k : int, optional
+        Only the top_k most visited channels are kept, the others are
+        merged into buckets before the chain is built
+    groups : dict, optional
+        Bucket names and regular expressions for the pruned channels.
+        Pruned channels that match no expression go to 'OTHER'
 
     Atributes
     ---------
-    list_of_paths : list of str
-        List of all the different customer paths present in the dataset
+    counts : TransitionCounts
+        Unnormalised transition counts, the only data kept from the
+        dataset
     total_conversion : int
         Number of conversions in the dataset
     unique_channels : list of str
@@ -40,100 +99,281 @@ class MarkovDB:
         Returns a dictionary, with the keys as the different possible
         states, and the values equal to the probability for that value
         to happen
-    transition_matrix : pandas dataframe
+    transition_matrix : numpy array or scipy CSR matrix
         Returns the matrix with the different probabilities for
         each state
+    transition_matrix_df : pandas dataframe
+        Same matrix labeled with the channel names. Uses a sparse
+        dataframe in sparse mode. Only built when it is accessed
     markov_matrix : MarkovMatrix
         Returns a MarkovMatrix object created with the transition matrix
     channel_to_key : dict
-        Mapping of the channel name with the integer it represents
+        Mapping of the channel name with the integer it represents. For
+        order 1 this is also its index in the transition matrix
+    state_keys : numpy array
+        Packed keys of the states of the chain other than 'START', 'NULL'
+        and 'CONVERSION', in the order of the transition matrix
+    paths : list of EncodedPaths
+        Unique paths of each chunk, only with keep_paths=True
+    buckets : dict
+        Bucket of each pruned channel, empty unless min_count or top_k is
+        given
+    bucketed_mass : float
+        Fraction of the transition counts from or to a state with a
+        pruned channel
     """
 
-    def __init__(self, dataset, var_path, var_conv, var_value, separator):
+    def __init__(
+        self,
+        dataset,
+        var_path,
+        var_conv,
+        var_value,
+        separator,
+        sparse=False,
+        lazy=False,
+        var_count=None,
+        order=1,
+        stats=None,
+        keep_paths=False,
+        min_count=None,
+        top_k=None,
+        groups=None,
+    ):
 
-        self.dataset = dataset
         self.var_path = var_path
         self.var_conv = var_conv
         self.var_value = var_value
         self.separator = separator
-        self.total_conversions = 0
-        self.total_value = 0
-        self.list_of_paths = self.__get_list_of_paths()
-        self.unique_channels = self.__get_channels()
-        self.channel_to_key = {
-            self.unique_channels[i]: i
-            for i in range(0, len(self.unique_channels))
-        }
-        self.transition_matrix = self.__get_transition_matrix()
-        self.transition_matrix_df = self.__get_transition_matrix_df()
-        self.markov_matrix = self.__get_markov_matrix()
+        self.sparse = sparse
+        self.lazy = lazy
+        self.var_count = var_count
+        self.order = order
+        self.stats = stats
+        self.keep_paths = keep_paths
+        self.min_count = min_count
+        self.top_k = top_k
+        self.groups = groups
+        self.paths = []
+        self.counts = TransitionCounts(
+            var_path, var_conv, var_value, separator, var_count, order
+        )
+        self.__fitted = False
+
+        if isinstance(dataset, Iterator):
+            for chunk in dataset:
+                self.partial_fit(chunk)
+        elif dataset is not None:
+            self.partial_fit(dataset)
+
+    @classmethod
+    def from_counts(
+        cls,
+        counts,
+        sparse=False,
+        lazy=False,
+        stats=None,
+        min_count=None,
+        top_k=None,
+        groups=None,
+    ):
+        """
+        Returns a MarkovDB built from a TransitionCounts object, for
+        instance the sum of the counts of several shards of data
+        """
+        db = cls(
+            None,
+            counts.var_path,
+            counts.var_conv,
+            counts.var_value,
+            counts.separator,
+            sparse=sparse,
+            lazy=lazy,
+            var_count=counts.var_count,
+            order=counts.order,
+            stats=stats,
+            min_count=min_count,
+            top_k=top_k,
+            groups=groups,
+        )
+        db.counts = counts
+
+        return db
+
+    def save(self, file):
+        """
+        Stores the transition counts in a .npz file (see
+        TransitionCounts.save). The chain is built again from them when
+        the file is loaded
+        """
+        self.counts.save(file)
+
+    @classmethod
+    def load(cls, file, sparse=False, lazy=False, mmap=True, stats=None):
+        """
+        Returns the MarkovDB stored in a .npz file created with save. With
+        mmap=True the counts are memory mapped from the file
+        """
+        return cls.from_counts(
+            TransitionCounts.load(file, mmap=mmap),
+            sparse=sparse,
+            lazy=lazy,
+            stats=stats,
+        )
 
     def __str__(self):
-        return (
-            """\ndataset:\n{0}\n\nseparator:\n{1}\n\nchannels:\n{2}""".format(
-                self.dataset, self.separator, self.unique_channels
-            )
+        return """\nseparator:\n{0}\n\nchannels:\n{1}""".format(
+            self.separator, self.unique_channels
         )
 
-    def __get_channels(self):
+    def partial_fit(self, chunk):
         """
-        Returns a sorted list with the different channel possibilities of the
-        customer journey
+        Adds a chunk of data (list of dict, pandas dataframe or pyarrow
+        table) to the transition counts. Only the counts are kept, and the
+        chain is built again from them the next time it is used
         """
-        channels = set()
-        for row in self.dataset:
-            rstates = row[self.var_path].split(self.separator)
-            for state in rstates:
-                if state != "":
-                    channels.add(state)
-        try:
-            channels.remove("NULL")
-            return ["START"] + sorted(list(channels)) + ["NULL", "CONVERSION"]
-        except:
-            return ["START"] + sorted(list(channels)) + ["NULL", "CONVERSION"]
+        with stage(self.stats, "parse") as info:
+            paths = EncodedPaths(
+                chunk,
+                self.var_path,
+                self.var_conv,
+                self.var_value,
+                self.separator,
+                self.var_count,
+            )
+            info["paths"] = len(paths.counts)
+        with stage(self.stats, "count") as info:
+            self.counts.add_paths(paths)
+            info["transitions"] = len(self.counts.weights)
+        if self.keep_paths:
+            self.paths.append(paths)
+        self.__fitted = False
 
-    def __get_list_of_paths(self):
+        return self
+
+    def __fit(self):
         """
-        Returns a list of all the different customer paths present in the dataset
+        Builds the chain from the transition counts, if they changed since
+        it was last built
         """
-        list_of_paths = []
-        for row in self.dataset:
-            self.total_conversions += row[self.var_conv]
-            self.total_value += row[self.var_value]
-            rstates = row[self.var_path].split(self.separator)
-            rstates = ["START"] + rstates
-            if row[self.var_conv] > 0:
-                rstates = rstates + ["CONVERSION"]
-            else:
-                rstates = rstates + ["NULL"]
-            list_of_paths.append(rstates)
+        if self.__fitted:
+            return
+        self.__fitted = True
+
+        counts = self.counts
+        self.__buckets = {}
+        self.__bucketed_mass = 0.0
+        if self.min_count is not None or self.top_k is not None:
+            with stage(self.stats, "prune") as info:
+                counts, self.__buckets = self.counts.prune(
+                    self.min_count, self.top_k, self.groups
+                )
+                total = self.counts.weights.sum()
+                if self.__buckets and total:
+                    bucketed = self.counts.get_weight(self.__buckets)
+                    self.__bucketed_mass = (bucketed / total).item()
+                info["pruned"] = len(self.__buckets)
+                info["bucketed_mass"] = self.__bucketed_mass
+
+        with stage(self.stats, "matrix") as info:
+            channels, keys, rows, cols, weights = counts.get_transitions()
+
+            self.__unique_channels = channels
+            self.__channel_to_key = {
+                channels[i]: i for i in range(0, len(channels))
+            }
+            self.__state_keys = keys
+            self.__state_channels = None
+            self.__transition_matrix = self.__get_transition_matrix(
+                rows, cols, weights
+            )
+            info["size"] = len(keys) + 3
+            info["nnz"] = len(weights) + 2
+
+        # Built on first access, so the removal effects never build them
+        self.__transition_matrix_df = None
+        self.__markov_matrix = None
+
+    @property
+    def total_conversions(self):
+        return self.counts.total_conversions
+
+    @property
+    def total_value(self):
+        return self.counts.total_value
+
+    @property
+    def buckets(self):
+        self.__fit()
+        return self.__buckets
+
+    @property
+    def bucketed_mass(self):
+        self.__fit()
+        return self.__bucketed_mass
+
+    @property
+    def unique_channels(self):
+        self.__fit()
+        return self.__unique_channels
+
+    @property
+    def channel_to_key(self):
+        self.__fit()
+        return self.__channel_to_key
+
+    @property
+    def state_keys(self):
+        self.__fit()
+        return self.__state_keys
 
-        return list_of_paths
+    @property
+    def transition_matrix(self):
+        self.__fit()
+        return self.__transition_matrix
 
-    def __get_transition_matrix(self):
+    @property
+    def transition_matrix_df(self):
+        self.__fit()
+        if self.__transition_matrix_df is None:
+            self.__transition_matrix_df = self.__get_transition_matrix_df()
+        return self.__transition_matrix_df
+
+    @property
+    def markov_matrix(self):
+        self.__fit()
+        if self.__markov_matrix is None:
+            with stage(self.stats, "solve"):
+                self.__markov_matrix = self.__get_markov_matrix()
+        return self.__markov_matrix
+
+    def __get_transition_matrix(self, rows, cols, weights):
         """
         Returns the matrix with the different probabilities for
         each state
         """
 
-        channel_to_key = self.channel_to_key
+        size = len(self.state_keys) + 3
 
-        size = len(self.unique_channels)
+        # Absorption states
+        absorption = [size - 2, size - 1]
+        rows = concatenate([absorption, rows])
+        cols = concatenate([absorption, cols])
+        weights = concatenate([ones(2), weights])
 
-        transition_matrix = zeros((size, size))
+        if self.sparse:
+            from scipy.sparse import coo_matrix, diags
 
-        # Absorption states
-        i = channel_to_key["CONVERSION"]
-        j = channel_to_key["NULL"]
-        transition_matrix[i, i] = 1
-        transition_matrix[j, j] = 1
-
-        for user_path in self.list_of_paths:
-            for index, elem in enumerate(user_path):
-                if elem not in ["CONVERSION", "NULL"]:
-                    i = channel_to_key[elem]
-                    j = channel_to_key[user_path[index + 1]]
-                    transition_matrix[i, j] += 1
+            transition_matrix = coo_matrix(
+                (weights, (rows, cols)), shape=(size, size)
+            ).tocsr()
+            row_sums = asarray(transition_matrix.sum(axis=1)).ravel()
+
+            return (diags(1 / row_sums) @ transition_matrix).tocsr()
+
+        transition_matrix = bincount(
+            rows * size + cols, weights=weights, minlength=size * size
+        ).reshape((size, size))
 
         return transition_matrix / transition_matrix.sum(axis=1, keepdims=True)
 
@@ -143,22 +383,392 @@ class MarkovDB:
         transition matrix
         """
 
-        return MarkovMatrix(self.transition_matrix)
+        markov_matrix = MarkovMatrix(
+            self.transition_matrix, sparse=self.sparse, lazy=self.lazy
+        )
+        if not self.lazy:
+            markov_matrix.m
+
+        return markov_matrix
+
+    def __get_state_names(self):
+        """
+        Returns the label of each state of the transition matrix. States
+        of order k are labeled with their channels joined by the separator
+        """
+        if self.order == 1:
+            return self.unique_channels
+
+        base = len(self.unique_channels) - 1
+        names = [
+            self.separator.join(self.unique_channels[c] for c in codes if c)
+            for codes in unpack_states(self.state_keys, base, self.order)
+        ]
+
+        return ["START"] + names + ["NULL", "CONVERSION"]
+
+    def __get_state(self, state):
+        """
+        Returns the index in the transition matrix of a state given by its
+        name. For order k > 1 a state is a tuple of up to k channel names,
+        and a single name refers to the state of that channel alone
+        """
+        size = len(self.state_keys) + 3
+
+        if not isinstance(state, (str, tuple)):
+            return state
+        elif state == "START":
+            return 0
+        elif state == "NULL":
+            return size - 2
+        elif state == "CONVERSION":
+            return size - 1
+        elif self.order == 1:
+            return self.channel_to_key[state]
+
+        channels = (state,) if isinstance(state, str) else state
+        codes = [0] * (self.order - len(channels)) + [
+            self.channel_to_key[c] for c in channels
+        ]
+        key = pack_states(codes, len(self.unique_channels) - 1)[0]
+        i = searchsorted(self.state_keys, key)
+        if i == len(self.state_keys) or self.state_keys[i] != key:
+            raise KeyError(state)
+
+        return i + 1
+
+    def __get_removed_states(self, channels):
+        """
+        Returns the indexes in the transition matrix of every state that
+        contains one of the channels
+        """
+        codes = [self.channel_to_key[c] for c in channels]
+
+        if self.order == 1:
+            return codes
+
+        if self.__state_channels is None:
+            self.__state_channels = unpack_states(
+                self.state_keys, len(self.unique_channels) - 1, self.order
+            )
+        contains = isin(self.__state_channels, codes).any(axis=1)
+
+        return (flatnonzero(contains) + 1).tolist()
 
     def __get_transition_matrix_df(self):
+        import pandas as pd
+
+        names = self.__get_state_names()
+
+        if self.sparse:
+            return pd.DataFrame.sparse.from_spmatrix(
+                self.transition_matrix,
+                columns=names,
+                index=names,
+            )
 
         df = pd.DataFrame(
             self.transition_matrix,
-            columns=self.unique_channels,
-            index=self.unique_channels,
+            columns=names,
+            index=names,
         )
 
         return df
 
     def get_probability(self, trans_state, abs_state):
 
-        if isinstance(trans_state, str) and isinstance(abs_state, str):
-            trans_state = self.channel_to_key[trans_state]
-            abs_state = self.channel_to_key[abs_state]
+        trans_state = self.__get_state(trans_state)
+        abs_state = self.__get_state(abs_state)
 
         return self.markov_matrix.get_probability(trans_state, abs_state)
+
+    def get_probabilities(
+        self, trans_states=None, abs_state=None, frame=False
+    ):
+        """
+        Returns the probability to go from each state in trans_states to
+        abs_state, as a numpy array in the same order as trans_states. The
+        states can be given by name or by their index in the transition
+        matrix, and default to every transient state. If abs_state is None
+        there is one column for 'NULL' and one for 'CONVERSION'. With
+        frame=True the result is a pandas dataframe indexed by state name
+        """
+        if trans_states is None:
+            indexes = arange(len(self.state_keys) + 1)
+        else:
+            trans_states = list(trans_states)
+            indexes = asarray(
+                [self.__get_state(state) for state in trans_states],
+                dtype=int64,
+            )
+        if abs_state is not None:
+            abs_state = self.__get_state(abs_state)
+
+        probabilities = self.markov_matrix.get_probabilities(
+            indexes, abs_state
+        )
+        if not frame:
+            return probabilities
+
+        import pandas as pd
+
+        names = self.__get_state_names()
+        index = pd.Index([names[i] for i in indexes], name="state")
+        if abs_state is None:
+            return pd.DataFrame(
+                probabilities, index=index, columns=["NULL", "CONVERSION"]
+            )
+
+        return pd.DataFrame({names[abs_state]: probabilities}, index=index)
+
+    def get_removal_probability(self, trans_state, abs_state, channels):
+        """
+        Returns the probability to go from trans_state to abs_state once
+        every channel in channels is replaced by 'NULL'. For order k > 1
+        every state that contains one of the channels is removed
+        """
+
+        trans_state = self.__get_state(trans_state)
+        abs_state = self.__get_state(abs_state)
+        removed_states = self.__get_removed_states(channels)
+
+        return self.markov_matrix.get_removal_probability(
+            trans_state, abs_state, removed_states
+        )
+
+    def get_removal_probabilities(
+        self, trans_state, abs_state, channel_sets, n_jobs=1
+    ):
+        """
+        Returns a list with the probability to go from trans_state to
+        abs_state once each set of channels in channel_sets is replaced
+        by 'NULL', in the same order as channel_sets. With n_jobs > 1 the
+        sets are spread over a pool of worker processes, and only the
+        whole stage is recorded in stats, with channels_recorded False
+        """
+
+        trans_state = self.__get_state(trans_state)
+        abs_state = self.__get_state(abs_state)
+        removals = [
+            self.__get_removed_states(channels) for channels in channel_sets
+        ]
+
+        markov_matrix = self.markov_matrix
+
+        with stage(
+            self.stats,
+            "removal",
+            channel_sets=len(channel_sets),
+            n_jobs=n_jobs,
+        ) as info:
+            info["channels_recorded"] = n_jobs == 1
+            if n_jobs != 1:
+                from .RemovalPool import RemovalPool
+
+                with RemovalPool(markov_matrix, n_jobs) as pool:
+                    return pool.get_removal_probabilities(
+                        trans_state, abs_state, removals
+                    )
+
+            markov_matrix.prepare_removals(trans_state, removals)
+            probabilities = []
+            for channels, removed_states in zip(channel_sets, removals):
+                # Only single channels are recorded, sets (such as the
+                # complements of the exact Shapley values) have no channel
+                if self.stats is not None and len(channels) == 1:
+                    record = self.stats.channel(
+                        channels[0], len(removed_states)
+                    )
+                else:
+                    record = nullcontext()
+                with record:
+                    probabilities.append(
+                        markov_matrix.get_removal_probability(
+                            trans_state, abs_state, removed_states
+                        )
+                    )
+
+            return probabilities
+
+    def get_permutation_probabilities(self, trans_state, abs_state, channels):
+        """
+        Returns a list with the probability to go from trans_state to
+        abs_state when only the first k channels of channels are kept, for
+        k from 0 to len(channels). The other channels in channels are
+        replaced by 'NULL', and the channels not in channels are kept. The
+        whole list is computed in a single sequence of removals (see
+        MarkovMatrix.get_cumulative_removal_probabilities)
+        """
+
+        trans_state = self.__get_state(trans_state)
+        abs_state = self.__get_state(abs_state)
+
+        # Channels are removed from the last one, so each step only
+        # removes the states not removed by the previous steps
+        removed = set()
+        steps = []
+        for channel in reversed(channels):
+            step = [
+                state
+                for state in self.__get_removed_states([channel])
+                if state not in removed
+            ]
+            removed.update(step)
+            steps.append(step)
+
+        markov_matrix = self.markov_matrix
+        markov_matrix.prepare_removals(trans_state, steps)
+        probabilities = markov_matrix.get_cumulative_removal_probabilities(
+            trans_state, abs_state, steps
+        )
+        full = markov_matrix.get_probability(trans_state, abs_state)
+
+        return probabilities[::-1] + [full]
+
+    def get_bootstrap_probabilities(
+        self,
+        trans_state,
+        abs_state,
+        channel_sets,
+        replicates,
+        seed=None,
+        max_bytes=2**28,
+    ):
+        """
+        Returns the probability to go from trans_state to abs_state and
+        the removal probability of each set of channels in channel_sets
+        (see get_removal_probabilities) on bootstrap replicates of the
+        data, together with the conversions and value of each replicate.
+
+        Each replicate draws the same number of journeys as the data, as
+        multinomial weights over the unique paths kept with
+        keep_paths=True. The transition matrices of the replicates are
+        built and solved stacked, in batches that take about max_bytes
+
+        Returns
+        -------
+        probabilities : numpy array
+            Probability of each replicate
+        removal_probabilities : numpy array
+            Removal probability of each replicate (rows) and channel set
+            (columns)
+        conversions, values : numpy array
+            Conversions and value of each replicate
+        """
+        if not self.keep_paths:
+            raise ValueError(
+                "The bootstrap needs the paths, build the MarkovDB with "
+                "keep_paths=True"
+            )
+        if self.buckets:
+            raise ValueError("The bootstrap does not support pruned channels")
+
+        trans_state = self.__get_state(trans_state)
+        j = self.__get_state(abs_state) - len(self.state_keys) - 1
+        removals = [
+            self.__get_removed_states(channels) for channels in channel_sets
+        ]
+        size = len(self.state_keys) + 3
+        t = size - 2
+
+        # Transitions of every unique path, with the paths of all the
+        # chunks numbered one after the other
+        rows, cols, path, offset = [], [], [], 0
+        for paths in self.paths:
+            from_states, to_states, path_index = (
+                self.counts.get_path_transitions(paths)
+            )
+            rows.append(from_states)
+            cols.append(to_states)
+            path.append(path_index + offset)
+            offset += len(paths.counts)
+        cells = concatenate(rows) * size + concatenate(cols)
+        path = concatenate(path)
+        counts = concatenate([paths.counts for paths in self.paths])
+        # Conversions and value of a single journey of each path
+        conversions = concatenate(
+            [paths.conversions for paths in self.paths]
+        ) / counts
+        values = concatenate([paths.values for paths in self.paths]) / counts
+
+        rng = default_rng(seed)
+        journeys = int(round(counts.sum()))
+        batch_size = max(1, max_bytes // (8 * size * size))
+
+        results = []
+        for start in range(0, replicates, batch_size):
+            batch = min(batch_size, replicates - start)
+            weights = rng.multinomial(
+                journeys, counts / counts.sum(), size=batch
+            ).astype(float)
+
+            transitions = bincount(
+                (arange(batch)[:, None] * size * size + cells).ravel(),
+                weights=weights[:, path].ravel(),
+                minlength=batch * size * size,
+            ).reshape((batch, size, size))
+            # States not drawn in a replicate cannot be reached, and are
+            # sent to 'NULL' to keep the rows stochastic
+            row_sums = transitions[:, :t].sum(axis=2)
+            transitions[:, :t, t] += row_sums == 0
+            transitions[:, :t] /= transitions[:, :t].sum(
+                axis=2, keepdims=True
+            )
+
+            n = inv(identity(t) - transitions[:, :t, :t])
+            m_j = (n @ transitions[:, :t, t + j, None])[:, :, 0]
+
+            probabilities = m_j[:, trans_state]
+            removal_probabilities = empty((batch, len(removals)))
+            for k, removed_states in enumerate(removals):
+                if not removed_states:
+                    removal_probabilities[:, k] = probabilities
+                    continue
+                n_is = n[:, trans_state, removed_states]
+                n_ss = n[:, removed_states][:, :, removed_states]
+                # The mass of the removed states is redirected to 'NULL'
+                m_sj = m_j[:, removed_states] - (j == 0)
+                removal_probabilities[:, k] = probabilities - (
+                    n_is * solve(n_ss, m_sj[:, :, None])[:, :, 0]
+                ).sum(axis=1)
+
+            results.append(
+                (
+                    probabilities,
+                    removal_probabilities,
+                    weights @ conversions,
+                    weights @ values,
+                )
+            )
+
+        return tuple(
+            concatenate([result[i] for result in results]) for i in range(4)
+        )
+
+    def get_random_walks(
+        self, walkers=100000, seed=None, max_step=None, trans_state="START"
+    ):
+        """
+        Returns a RandomWalks object with a Monte Carlo estimate of the
+        chain from trans_state, which does not solve the chain and so
+        scales to very large numbers of states
+        """
+        return RandomWalks(
+            self.transition_matrix,
+            walkers,
+            start=self.__get_state(trans_state),
+            seed=seed,
+            max_step=max_step,
+        )
+
+    def get_simulated_removal_effects(self, walks, channel_sets):
+        """
+        Returns two numpy arrays with the removal effect of each set of
+        channels in channel_sets estimated from a RandomWalks object (see
+        get_random_walks), and its standard error
+        """
+        removals = [
+            self.__get_removed_states(channels) for channels in channel_sets
+        ]
+
+        return walks.get_removal_effects(removals)
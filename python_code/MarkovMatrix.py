@@ -1,5 +1,4 @@
 import numpy as np
-import warnings
 
 
 class MarkovMatrix:
@@ -12,6 +11,21 @@ class MarkovMatrix:
     ----------
     matrix_arr : list of lists
         Each list representing a single row. This will create a matrix
+    sparse : bool
+        If True, matrix_arr is a scipy sparse matrix and the absorption
+        probabilities are obtained from a sparse LU factorisation of
+        I - Q instead of inverting it
+    lazy : bool
+        If True, get_probability solves a single linear system for the
+        requested transient state instead of computing m. In dense mode the
+        removals also only solve for the rows of n of the starting and the
+        removed states (see prepare_removals), so neither n nor m is
+        formed. Whether lazy or not, q, r, n, m and lu are only computed
+        when they are first accessed, and then kept
+    n, m : numpy array, optional
+        Fundamental and absorption matrices already computed for
+        matrix_arr, for instance by another process. They are used as
+        they are instead of being computed again
 
 
     Attributes
@@ -37,7 +51,10 @@ class MarkovMatrix:
         information below)
     q,r,n,m : numpy matrix
         Matrices obtained from the standard matrix (see more information
-        below)
+        below). In sparse mode the fundamental matrix n is only formed
+        (as a dense array) when it is accessed
+    lu : scipy.sparse.linalg.SuperLU
+        Factorisation of I - Q, only in sparse mode
 
 
     Methods
@@ -46,21 +63,67 @@ class MarkovMatrix:
         Returns the probability that an absorbing chain will be
         absorbed in the absorbing state s_j if it starts in the transient
         state s_i
+    get_probabilities(transient_states, absorbing_state)
+        Returns the same probability for many transient states at once
+    get_removal_probability(transient_state, absorbing_state, removed_states)
+        Returns the same probability once the removed states are
+        redirected to a non converting absorbing state
+    get_cumulative_removal_probabilities(transient_state, absorbing_state,
+                                         steps)
+        Returns the same probability after each step of a sequence of
+        removals, each one adding to the states removed before
+    prepare_removals(transient_state, removals)
+        Solves at once for everything the given removals need, in lazy mode
     """
 
-    def __init__(self, matrix_arr):
+    def __init__(self, matrix_arr, sparse=False, lazy=False, n=None, m=None):
         self.matrix_obj = matrix_arr
+        self.sparse = sparse
+        self.lazy = lazy
+        self.__n = n
+        self.__m = m
+        self.__n_rows = {}
         self.epsilon = 0.02
         self.size = self.matrix_obj.shape[0]
         self.num_absorption_states = 2
 
+        self.__q = None
+        self.__r = None
+        self.__lu = None
+
         states = [i for i in range(self.size)]
         self.transient_states = states[: self.size - 2]
         self.absorption_states = states[self.size - 2 :]
-        self.q = self.__get_q()
-        self.r = self.__get_r()
-        self.n = self.__get_n()
-        self.m = self.__get_m()
+
+    @property
+    def q(self):
+        if self.__q is None:
+            self.__q = self.__get_q()
+        return self.__q
+
+    @property
+    def r(self):
+        if self.__r is None:
+            self.__r = self.__get_r()
+        return self.__r
+
+    @property
+    def lu(self):
+        if self.__lu is None:
+            self.__lu = self.__get_lu()
+        return self.__lu
+
+    @property
+    def n(self):
+        if self.__n is None:
+            self.__n = self.__get_n()
+        return self.__n
+
+    @property
+    def m(self):
+        if self.__m is None:
+            self.__m = self.__get_m()
+        return self.__m
 
     def __get_q(self):
         maximum = self.size - self.num_absorption_states
@@ -83,12 +146,80 @@ class MarkovMatrix:
         The ij-entry of the matrix N is the expected number of times the chain
         is in state s_j given that it starts in state s_i.
         """
+        if self.sparse:
+            t = self.size - self.num_absorption_states
+            return self.lu.solve(np.identity(t))
+
         pre_n = self.q.copy()
 
         np.fill_diagonal(pre_n, [i - 1 for i in self.q.diagonal()])
 
         return np.linalg.inv(-pre_n)
 
+    def __get_lu(self):
+        """
+        Sparse LU factorisation of I - Q, used in place of the fundamental
+        matrix to solve (I - Q)x = b
+        """
+        from scipy.sparse import identity
+        from scipy.sparse.linalg import splu
+
+        t = self.size - self.num_absorption_states
+
+        return splu((identity(t, format="csc") - self.q).tocsc())
+
+    def __get_n_row(self, i):
+        """
+        Returns the i-th row of the fundamental matrix N, solving
+        (I - Q)^T x = e_i when N has not been formed
+        """
+        if self.__n is not None:
+            return self.__n[i, :]
+
+        return self.__get_n_rows([i])[0]
+
+    def __get_n_rows(self, rows):
+        """
+        Returns the given rows of the fundamental matrix N when it has not
+        been formed. The rows that are not kept yet are found with a single
+        solve of (I - Q)^T X = E, and then kept
+        """
+        t = self.size - self.num_absorption_states
+        missing = sorted(set(rows).difference(self.__n_rows))
+        if missing:
+            e = np.zeros((t, len(missing)))
+            e[missing, range(len(missing))] = 1
+            if self.sparse:
+                x = self.lu.solve(e, trans="T")
+            else:
+                x = np.linalg.solve(np.identity(t) - self.q.T, e)
+            for k, i in enumerate(missing):
+                self.__n_rows[i] = x[:, k]
+
+        return np.array([self.__n_rows[i] for i in rows]).reshape(
+            (len(rows), t)
+        )
+
+    def __lazy_rows(self):
+        """
+        Whether the removals use rows of N solved on demand instead of
+        forming N and M, which is the case in dense lazy mode
+        """
+        return self.lazy and not self.sparse and self.__n is None
+
+    def __get_n_columns(self, columns):
+        """
+        Returns the given columns of the fundamental matrix N
+        """
+        if not self.sparse:
+            return self.n[:, columns]
+
+        t = self.size - self.num_absorption_states
+        e_s = np.zeros((t, len(columns)))
+        e_s[columns, range(len(columns))] = 1
+
+        return self.lu.solve(e_s)
+
     def __get_m(self):
         """
         Absorption matrix
@@ -99,6 +230,15 @@ class MarkovMatrix:
 
         M = NR
         """
+        if self.sparse:
+            return self.lu.solve(self.r.toarray())
+
+        if self.__n is None:
+            # Only the columns of R are needed, so solving is cheaper than
+            # inverting I - Q
+            t = self.size - self.num_absorption_states
+            return np.linalg.solve(np.identity(t) - self.q, self.r)
+
         return np.matmul(self.n, self.r)
 
     def get_probability(self, transient_state, absorbing_state):
@@ -113,38 +253,216 @@ class MarkovMatrix:
         transient_state : int
         """
 
-        transient_states = self.transient_states
-        absorption_states = self.absorption_states
+        self.__check_states([transient_state], absorbing_state)
+        j = self.absorption_states.index(absorbing_state)
 
-        if (transient_state in transient_states) and (
-            absorbing_state in absorption_states
-        ):
+        if self.__m is None and self.lazy:
+            m_i = self.r.T @ self.__get_n_row(transient_state)
+            return m_i[j]
 
-            elements = [
-                (i, j)
-                for i in self.transient_states
-                for j in self.absorption_states
-            ]
+        return self.m[transient_state, j]
 
-            prob = dict(zip(elements, self.m.flatten().tolist()))
+    def get_probabilities(self, transient_states=None, absorbing_state=None):
+        """
+        Returns the probabilities that an absorbing chain will be absorbed
+        in the absorbing state s_j if it starts in each of the transient
+        states, as a numpy array. If absorbing_state is None, returns one
+        column per absorbing state
 
-            return prob[(transient_state, absorbing_state)]
-        else:
+        Parameters
+        ----------
+        transient_states : array of int, optional
+            Defaults to every transient state
+        absorbing_state : int, optional
+        """
+        if transient_states is None:
+            transient_states = self.transient_states
+        transient_states = np.asarray(transient_states)
+        self.__check_states(transient_states, absorbing_state)
+
+        m = self.m[transient_states]
+        if absorbing_state is None:
+            return m
 
-            print(
-                "\nValid transient states   :{}".format(self.transient_states)
+        return m[:, self.absorption_states.index(absorbing_state)]
+
+    def __check_states(self, transient_states, absorbing_state):
+        """
+        Raises a TypeError if the states are not integers, and a
+        ValueError if one of them is not a transient state or if
+        absorbing_state is neither None nor an absorbing state
+        """
+        t = self.size - self.num_absorption_states
+        states = np.asarray(transient_states)
+        if states.dtype.kind not in "iu":
+            raise TypeError(
+                "Transient states must be integers, got {}".format(
+                    states.dtype
+                )
             )
-            print(
-                "\nValid absorption states  :{}\n".format(
-                    self.absorption_states
+        invalid = states[(states < 0) | (states >= t)]
+        if len(invalid):
+            raise ValueError(
+                "Invalid transient states {}, valid states are 0 to {}".format(
+                    invalid.tolist(), t - 1
+                )
+            )
+        if (
+            absorbing_state is not None
+            and absorbing_state not in self.absorption_states
+        ):
+            raise ValueError(
+                "Invalid absorbing state {}, valid states are {}".format(
+                    absorbing_state, self.absorption_states
                 )
             )
 
-            warnings.warn(
-                "Invalid combination of absorption and transient states"
+    def __get_redirected_m(self, j, rows):
+        """
+        Returns the given rows of the column j of m minus the mass of the
+        removed states that is redirected to it, 1 for the first absorbing
+        state
+        """
+        if self.__m is None and self.__lazy_rows():
+            m_sj = self.__get_n_rows(rows) @ self.r[:, j]
+        else:
+            m_sj = self.m[rows, j]
+
+        if j == 0:
+            return m_sj - 1
+
+        return m_sj
+
+    def prepare_removals(self, transient_state, removals):
+        """
+        Solves at once for the rows of N of transient_state and of every
+        state in removals (lists of removed states), so the removals that
+        follow do not solve a system each. It does nothing unless the
+        removals use rows of N solved on demand (dense lazy mode)
+        """
+        if self.__lazy_rows():
+            self.__get_n_rows(
+                sorted({transient_state}.union(*map(set, removals)))
             )
 
-            return None
+    def get_removal_probability(
+        self, transient_state, absorbing_state, removed_states
+    ):
+        """
+        Returns the probability that an absorbing chain will be absorbed in
+        the absorbing state s_j if it starts in the transient state s_i, once
+        every transition into the removed states is redirected to the first
+        absorbing state ('NULL' in MarkovDB).
+
+        Redirecting the inbound mass of a set of states S zeroes the columns
+        S of Q, which is a rank |S| update of I - Q. By the Woodbury identity
+        the new probability only depends on the fundamental matrix that is
+        already computed
+
+        m'_{ij} = m_{ij} - N_{iS} (N_{SS})^{-1} (m_{Sj} - d_j)
+
+        where d_j is 1 for the first absorbing state and 0 otherwise, as the
+        mass that reached S, N_{iS} (N_{SS})^{-1} 1, is absorbed there. No
+        new matrix has to be built or inverted for each removal.
+
+        Parameters
+        ----------
+        transient_state : int
+        absorbing_state : int
+        removed_states : list of int
+            Transient states removed together
+        """
+
+        removed_states = list(removed_states)
+        if transient_state in removed_states:
+            raise ValueError("The starting state cannot be removed")
+
+        j = self.absorption_states.index(absorbing_state)
+        prob = self.get_probability(transient_state, absorbing_state)
+
+        if len(removed_states) == 0:
+            return prob
+
+        n_is = self.__get_n_row(transient_state)[removed_states]
+        if self.__lazy_rows():
+            n_ss = self.__get_n_rows(removed_states)[:, removed_states]
+        else:
+            n_ss = self.__get_n_columns(removed_states)[removed_states, :]
+        m_sj = self.__get_redirected_m(j, removed_states)
+
+        return prob - n_is @ np.linalg.solve(n_ss, m_sj)
+
+    def get_cumulative_removal_probabilities(
+        self, transient_state, absorbing_state, steps
+    ):
+        """
+        Returns a list with the probability that an absorbing chain will be
+        absorbed in the absorbing state s_j if it starts in the transient
+        state s_i, after each step of removals. The states removed at each
+        step are added to the ones removed at the previous steps.
+
+        The inverse of N_{SS} in get_removal_probability is grown one step
+        at a time with the Schur complement of the new states D
+
+        C = N_{DD} - N_{DS} (N_{SS})^{-1} N_{SD}
+
+        so the whole sequence costs about as much as a single removal of
+        all its states.
+
+        Parameters
+        ----------
+        transient_state : int
+        absorbing_state : int
+        steps : list of list of int
+            Transient states removed at each step, not removed before
+        """
+
+        j = self.absorption_states.index(absorbing_state)
+        prob = self.get_probability(transient_state, absorbing_state)
+        n_i = self.__get_n_row(transient_state)
+
+        t = self.size - self.num_absorption_states
+        removed = []
+        n_removed = np.zeros((t, 0))
+        m_removed = np.zeros(0)
+        inverse = np.zeros((0, 0))
+        probabilities = []
+
+        for step in steps:
+            step = list(step)
+            if transient_state in step:
+                raise ValueError("The starting state cannot be removed")
+
+            if step:
+                if self.__lazy_rows():
+                    n_step = self.__get_n_rows(step)
+                    n_sd = self.__get_n_rows(removed)[:, step]
+                    n_ds = n_step[:, removed]
+                    n_dd = n_step[:, step]
+                else:
+                    n_step = self.__get_n_columns(step)
+                    n_sd = n_step[removed, :]
+                    n_ds = n_removed[step, :]
+                    n_dd = n_step[step, :]
+                    n_removed = np.hstack([n_removed, n_step])
+                inverse_n_sd = inverse @ n_sd
+                n_ds_inverse = n_ds @ inverse
+                c_inverse = np.linalg.inv(n_dd - n_ds @ inverse_n_sd)
+                top_right = -inverse_n_sd @ c_inverse
+                inverse = np.block(
+                    [
+                        [inverse - top_right @ n_ds_inverse, top_right],
+                        [-c_inverse @ n_ds_inverse, c_inverse],
+                    ]
+                )
+                removed += step
+                m_removed = np.concatenate(
+                    [m_removed, self.__get_redirected_m(j, step)]
+                )
+
+            probabilities.append(prob - n_i[removed] @ inverse @ m_removed)
+
+        return probabilities
 
     '''
     CODE THAT MAY BE USEFUL IN THE FUTURE, BUT IT'S NOT NECESSARY FOR THIS
@@ -0,0 +1,192 @@
+import numpy as np
+
+
+class RandomWalks:
+    """
+    Monte Carlo estimate of an absorbing Markov chain
+
+    ...
+
+    A batch of walkers starts from the same transient state and is moved
+    one step at a time, all the walkers at once. Each step draws a uniform
+    number per walker and looks it up in the cumulative transition row of
+    its state, so the cost grows with the number of walkers and steps, and
+    no matrix is inverted. The last two states of the matrix are the
+    absorbing 'NULL' and 'CONVERSION' states, as in MarkovMatrix.
+
+    The states visited by the walkers that convert are kept, so the same
+    walks also estimate the removal of any set of states: a walk still
+    converts once the states are removed only if it never visited them.
+
+    Parameters
+    ----------
+    matrix_arr : numpy array or scipy sparse matrix
+        Right stochastic transition matrix
+    walkers : int
+        Number of walkers
+    start : int
+        Transient state the walkers start from
+    seed : int, optional
+        Seed of the random generator
+    max_step : int, optional
+        Maximum number of steps of a walk. Walkers that are not absorbed
+        after max_step steps count as not converted
+
+    Atributes
+    ---------
+    conversions : int
+        Number of walkers absorbed in 'CONVERSION'
+    truncated : int
+        Number of walkers stopped by max_step
+    steps : int
+        Number of steps of the longest walk
+    conversion_probability : float
+        Estimated probability to go from start to 'CONVERSION'
+    standard_error : float
+        Standard error of conversion_probability
+    visits : numpy array
+        Number of converting walks that visited each state
+
+    Methods
+    -------
+    get_removal_probabilities(removals)
+        Returns the estimated probability to convert once each set of
+        states is removed, with its standard error
+    get_removal_effects(removals)
+        Returns the estimated relative drop of the conversion probability
+        once each set of states is removed, with its standard error
+    """
+
+    def __init__(self, matrix_arr, walkers, start=0, seed=None, max_step=None):
+
+        self.walkers = walkers
+        self.start = start
+        self.seed = seed
+        self.max_step = max_step
+        self.size = matrix_arr.shape[0]
+
+        self.__simulate(matrix_arr)
+
+    def __get_cumulative_rows(self, matrix_arr):
+        """
+        Returns the row pointers and column indexes of the nonzero
+        transitions in CSR order, with the cumulative sum of their
+        probabilities over the whole matrix
+        """
+        if hasattr(matrix_arr, "tocsr"):
+            matrix = matrix_arr.tocsr()
+            matrix.sort_indices()
+            indptr = matrix.indptr.astype(np.int64)
+            indices = matrix.indices.astype(np.int64)
+            data = matrix.data
+        else:
+            rows, indices = np.nonzero(matrix_arr)
+            data = matrix_arr[rows, indices]
+            indptr = np.zeros(self.size + 1, dtype=np.int64)
+            indptr[1:] = np.cumsum(np.bincount(rows, minlength=self.size))
+
+        return indptr, indices, np.cumsum(data)
+
+    def __simulate(self, matrix_arr):
+        """
+        Moves the walkers until they are absorbed or reach max_step
+        """
+        indptr, indices, cumulative = self.__get_cumulative_rows(matrix_arr)
+        # Cumulative probability before and at the end of each row
+        row_end = cumulative[indptr[1:] - 1]
+        row_start = np.concatenate([[0], cumulative])[indptr[:-1]]
+
+        rng = np.random.default_rng(self.seed)
+        null = self.size - 2
+        walker_ids = np.arange(self.walkers)
+        states = np.full(self.walkers, self.start, dtype=np.int64)
+        absorbed = np.full(self.walkers, -1, dtype=np.int64)
+        visited_walkers = [walker_ids]
+        visited_states = [states]
+
+        self.steps = 0
+        while len(walker_ids) and (
+            self.max_step is None or self.steps < self.max_step
+        ):
+            targets = row_start[states] + rng.random(len(states)) * (
+                row_end[states] - row_start[states]
+            )
+            k = np.searchsorted(cumulative, targets, side="right")
+            states = indices[np.minimum(k, indptr[states + 1] - 1)]
+            self.steps += 1
+
+            done = states >= null
+            absorbed[walker_ids[done]] = states[done]
+            walker_ids = walker_ids[~done]
+            states = states[~done]
+            visited_walkers.append(walker_ids)
+            visited_states.append(states)
+
+        converted = absorbed == self.size - 1
+        self.conversions = int(converted.sum())
+        self.truncated = len(walker_ids)
+
+        # Distinct states visited by each converting walker, sorted by
+        # state so the walkers of any set of states are contiguous
+        visited_walkers = np.concatenate(visited_walkers)
+        visited_states = np.concatenate(visited_states)
+        keep = converted[visited_walkers]
+        keys = np.unique(
+            visited_states[keep] * self.walkers + visited_walkers[keep]
+        )
+        self.__visit_walkers = keys % self.walkers
+        self.visits = np.bincount(keys // self.walkers, minlength=self.size)
+        self.__visit_ptr = np.concatenate([[0], np.cumsum(self.visits)])
+
+        p = self.conversions / self.walkers
+        self.conversion_probability = p
+        self.standard_error = np.sqrt(p * (1 - p) / self.walkers)
+
+    def __get_removed_conversions(self, removed_states):
+        """
+        Returns the number of converting walks that visited at least one
+        of the removed states
+        """
+        removed_states = list(removed_states)
+        if self.start in removed_states:
+            raise ValueError("The starting state cannot be removed")
+        if len(removed_states) == 1:
+            return self.visits[removed_states[0]]
+
+        walkers = [
+            self.__visit_walkers[self.__visit_ptr[s] : self.__visit_ptr[s + 1]]
+            for s in removed_states
+        ]
+        if not walkers:
+            return 0
+
+        return len(np.unique(np.concatenate(walkers)))
+
+    def get_removal_probabilities(self, removals):
+        """
+        Returns two numpy arrays with the estimated probability to convert
+        once each set of states in removals is redirected to 'NULL', and
+        its standard error
+        """
+        lost = np.array(
+            [self.__get_removed_conversions(s) for s in removals], dtype=float
+        )
+        p = (self.conversions - lost) / self.walkers
+
+        return p, np.sqrt(p * (1 - p) / self.walkers)
+
+    def get_removal_effects(self, removals):
+        """
+        Returns two numpy arrays with the estimated removal effect of each
+        set of states in removals, the share of converting walks that
+        visit them, and its standard error
+        """
+        lost = np.array(
+            [self.__get_removed_conversions(s) for s in removals], dtype=float
+        )
+        if self.conversions == 0:
+            return np.zeros(len(lost)), np.zeros(len(lost))
+
+        effects = lost / self.conversions
+
+        return effects, np.sqrt(effects * (1 - effects) / self.conversions)
@@ -0,0 +1,165 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from .MarkovMatrix import MarkovMatrix
+
+# MarkovMatrix rebuilt by each worker process from the shared arrays
+_worker_matrix = None
+_worker_blocks = []
+
+
+def _attach(name, shape, dtype):
+    """
+    Returns a numpy array backed by an existing shared memory block
+    """
+    # Workers share the resource tracker of the parent, which stays the
+    # only process that unlinks the block
+    shm = SharedMemory(name=name)
+    _worker_blocks.append(shm)
+
+    return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _init_worker(specs, sparse):
+    """
+    Rebuilds the MarkovMatrix of the parent process from shared memory
+    """
+    global _worker_matrix
+
+    arrays = {key: _attach(*spec) for key, spec in specs.items()}
+
+    if sparse:
+        from scipy.sparse import csr_matrix
+
+        size = len(arrays["indptr"]) - 1
+        matrix = csr_matrix(
+            (arrays["data"], arrays["indices"], arrays["indptr"]),
+            shape=(size, size),
+        )
+        _worker_matrix = MarkovMatrix(matrix, sparse=True, m=arrays["m"])
+    else:
+        _worker_matrix = MarkovMatrix(
+            arrays["matrix"], n=arrays["n"], m=arrays["m"]
+        )
+
+
+def _removal_probabilities(transient_state, absorbing_state, removals):
+    """
+    Returns the removal probability of each set of states in removals
+    """
+    return [
+        _worker_matrix.get_removal_probability(
+            transient_state, absorbing_state, removed_states
+        )
+        for removed_states in removals
+    ]
+
+
+class RemovalPool:
+    """
+    Process pool for removal probabilities
+
+    ...
+
+    The arrays that describe the solved chain are copied once into shared
+    memory, and every worker rebuilds a MarkovMatrix on top of them when it
+    starts. Tasks only carry the states to remove, so nothing else is
+    pickled per task. In dense mode the workers share the fundamental
+    matrix of the parent; in sparse mode they share the CSR matrix and
+    each one factorises it once.
+
+    Parameters
+    ----------
+    markov_matrix : MarkovMatrix
+        Chain to compute the removal probabilities on
+    n_jobs : int
+        Number of worker processes
+
+    Methods
+    -------
+    get_removal_probabilities(transient_state, absorbing_state, removals)
+        Returns a list with the removal probability of each set of states,
+        in the same order as removals
+    close()
+        Shuts the workers down and releases the shared memory
+    """
+
+    def __init__(self, markov_matrix, n_jobs):
+
+        self.markov_matrix = markov_matrix
+        self.n_jobs = n_jobs
+        self.blocks = []
+
+        if markov_matrix.sparse:
+            matrix = markov_matrix.matrix_obj
+            arrays = {
+                "data": matrix.data,
+                "indices": matrix.indices,
+                "indptr": matrix.indptr,
+                "m": markov_matrix.m,
+            }
+        else:
+            arrays = {
+                "matrix": np.asarray(markov_matrix.matrix_obj),
+                "n": markov_matrix.n,
+                "m": markov_matrix.m,
+            }
+
+        specs = {key: self.__share(arr) for key, arr in arrays.items()}
+        self.executor = ProcessPoolExecutor(
+            max_workers=n_jobs,
+            initializer=_init_worker,
+            initargs=(specs, markov_matrix.sparse),
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __share(self, arr):
+        """
+        Copies arr into a new shared memory block and returns what the
+        workers need to attach to it
+        """
+        arr = np.ascontiguousarray(arr)
+        shm = SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+        self.blocks.append(shm)
+
+        return shm.name, arr.shape, arr.dtype.str
+
+    def get_removal_probabilities(
+        self, transient_state, absorbing_state, removals
+    ):
+        """
+        Returns a list with the removal probability of each set of states
+        in removals, in the same order
+        """
+        removals = list(removals)
+        chunk_size = max(1, -(-len(removals) // (4 * self.n_jobs)))
+        chunks = [
+            removals[i : i + chunk_size]
+            for i in range(0, len(removals), chunk_size)
+        ]
+        results = self.executor.map(
+            _removal_probabilities,
+            [transient_state] * len(chunks),
+            [absorbing_state] * len(chunks),
+            chunks,
+        )
+
+        return [prob for chunk in results for prob in chunk]
+
+    def close(self):
+        """
+        Shuts the workers down and releases the shared memory
+        """
+        self.executor.shutdown()
+        for shm in self.blocks:
+            shm.close()
+            shm.unlink()
+        self.blocks = []
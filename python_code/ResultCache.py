@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+
+class ResultCache:
+    """
+    On-disk cache of attribution results
+
+    ...
+
+    Each result is stored in its own file, named after a key built from
+    the fingerprint of the transition counts (see
+    TransitionCounts.fingerprint) and the options of the attribution. Any
+    change in the data or in the options gives a different key, so stale
+    results are never returned. When the files take more than max_bytes,
+    the least recently used ones are deleted.
+
+    Parameters
+    ----------
+    directory : str
+        Directory of the cache files, created if it does not exist
+    max_bytes : int
+        Maximum total size of the cache files
+
+    Methods
+    -------
+    get_key(counts, **params)
+        Returns the key of the results for some counts and options
+    get(key)
+        Returns the results stored under a key, or None
+    put(key, result)
+        Stores the results under a key
+    clear()
+        Deletes every result
+    """
+
+    suffix = ".pkl"
+
+    def __init__(self, directory, max_bytes=2**28):
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def __get_path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def __get_files(self):
+        """
+        Returns the path, size and last access time of every cache file
+        """
+        files = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(self.suffix):
+                    stat = entry.stat()
+                    files.append((entry.path, stat.st_size, stat.st_mtime))
+
+        return files
+
+    def get_key(self, counts, **params):
+        """
+        Returns the key of the results for a TransitionCounts object and
+        the options that the results depend on
+        """
+        h = hashlib.blake2b(digest_size=16)
+        h.update(counts.fingerprint().encode())
+        h.update(json.dumps(params, sort_keys=True).encode())
+
+        return h.hexdigest()
+
+    def get(self, key):
+        """
+        Returns the results stored under a key, or None if there are none
+        """
+        path = self.__get_path(key)
+        try:
+            with open(path, "rb") as f:
+                result = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+        # The modification time is used as the last access time
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return result
+
+    def put(self, key, result):
+        """
+        Stores the results under a key, then deletes the least recently
+        used results until the cache fits in max_bytes
+        """
+        # Written to a temporary file first, so readers never see a
+        # partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.__get_path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        self.__evict()
+
+    def __evict(self):
+        """
+        Deletes the least recently used files while the cache takes more
+        than max_bytes
+        """
+        files = sorted(self.__get_files(), key=lambda file: file[2])
+        total = sum(size for _, size, _ in files)
+
+        for path, size, _ in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        """
+        Deletes every result in the cache
+        """
+        for path, _, _ in self.__get_files():
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
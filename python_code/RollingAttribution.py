@@ -0,0 +1,153 @@
+from collections import OrderedDict
+
+from .MarkovAttribution import MarkovAttribution
+from .MarkovDB import MarkovDB
+from .TransitionCounts import TransitionCounts
+
+
+class RollingAttribution:
+    """
+    Attribution over a rolling window of periods
+
+    ...
+
+    The transition counts of each period (a day, for instance) are kept
+    separately, together with their sum over the window. Adding a period
+    adds its counts to the sum and, once the window is full, the counts of
+    the oldest period are subtracted from it. The attribution is then
+    computed from the summed counts, so the data of the periods already in
+    the window is never read again.
+
+    Parameters
+    ----------
+    var_path : str
+        Name of the path field
+    var_conv : str
+        Name of the conversion field
+    var_value : str
+        Name of the value field
+    separator : str
+        The path separator for each column (' > ' for example) that
+        indicates the customer journey
+    window : int
+        Number of periods in the window
+    var_count : str, optional
+        Name of the field with the number of journeys each row stands for
+    order : int
+        Order of the Markov chain
+    sparse : bool
+        If True, the chain is solved in sparse mode (see MarkovDB)
+    n_jobs : int
+        Number of worker processes for the removal effects
+    lazy : bool
+        If True, the chain is only solved for the states that the removals
+        need (see MarkovDB)
+
+    Atributes
+    ---------
+    periods : OrderedDict
+        Transition counts of each period in the window, oldest first
+    counts : TransitionCounts
+        Sum of the transition counts of the periods in the window
+    attribution : MarkovAttribution
+        Attribution of the current window, computed when it is first
+        accessed after the window changes
+    full_probability : float
+        Probability to go from 'START' to 'CONVERSION' in the window
+    df_info : pandas dataframe
+        Attribution of each channel in the window
+
+    Methods
+    -------
+    add(period, chunk)
+        Adds the data of a period, evicting the oldest one if the window
+        is full
+    evict(period)
+        Removes a period from the window
+    """
+
+    def __init__(
+        self,
+        var_path,
+        var_conv,
+        var_value,
+        separator,
+        window,
+        var_count=None,
+        order=1,
+        sparse=False,
+        n_jobs=1,
+        lazy=False,
+    ):
+
+        self.var_path = var_path
+        self.var_conv = var_conv
+        self.var_value = var_value
+        self.separator = separator
+        self.window = window
+        self.var_count = var_count
+        self.order = order
+        self.sparse = sparse
+        self.n_jobs = n_jobs
+        self.lazy = lazy
+        self.periods = OrderedDict()
+        self.counts = self.__new_counts()
+        self.__attribution = None
+
+    def __new_counts(self):
+        return TransitionCounts(
+            self.var_path,
+            self.var_conv,
+            self.var_value,
+            self.separator,
+            self.var_count,
+            self.order,
+        )
+
+    def add(self, period, chunk):
+        """
+        Adds the data of a period, which can be a list of dict, a pandas
+        dataframe or a pyarrow table. Adding data to a period already in
+        the window adds to its counts. Returns the list of evicted periods
+        """
+        counts = self.__new_counts().partial_fit(chunk)
+        if period in self.periods:
+            self.periods[period].merge(counts)
+        else:
+            self.periods[period] = counts
+        self.counts.merge(counts)
+        self.__attribution = None
+
+        evicted = []
+        while len(self.periods) > self.window:
+            oldest = next(iter(self.periods))
+            self.evict(oldest)
+            evicted.append(oldest)
+
+        return evicted
+
+    def evict(self, period):
+        """
+        Removes a period from the window
+        """
+        self.counts.subtract(self.periods.pop(period))
+        self.__attribution = None
+
+    @property
+    def attribution(self):
+        if self.__attribution is None:
+            db = MarkovDB.from_counts(
+                self.counts, sparse=self.sparse, lazy=self.lazy
+            )
+            self.__attribution = MarkovAttribution.from_db(
+                db, n_jobs=self.n_jobs
+            )
+        return self.__attribution
+
+    @property
+    def full_probability(self):
+        return self.attribution.full_probability
+
+    @property
+    def df_info(self):
+        return self.attribution.df_info
@@ -0,0 +1,267 @@
+from collections.abc import Iterator
+from itertools import repeat
+
+from .EncodedPaths import EncodedPaths, sort_segments
+from .MarkovAttribution import MarkovAttribution
+from .MarkovDB import MarkovDB
+from .TransitionCounts import TransitionCounts
+
+
+def _attribute_segment(counts, sparse, lazy, method, samples, seed, pruning):
+    """
+    Returns the probability of conversion, the effect of each channel, the
+    attribution and the bucketed mass (see MarkovDB) of the transition
+    counts of a segment. Segments with no conversions are not solved and
+    attribute nothing
+    """
+    if not counts.total_conversions:
+        bucketed_mass = 0.0
+        if pruning["min_count"] is not None or pruning["top_k"] is not None:
+            pruned, buckets = counts.prune(**pruning)
+            total = counts.weights.sum()
+            if buckets and total:
+                bucketed_mass = (counts.get_weight(buckets) / total).item()
+            counts = pruned
+        channels = sorted(counts.channels)
+        zeros = [0.0] * len(channels)
+        info = {
+            "channel_name": channels,
+            "total_conversion": zeros,
+            "total_conversion_value": zeros,
+        }
+        return 0.0, dict.fromkeys(channels, 0.0), info, bucketed_mass
+
+    attribution = MarkovAttribution.from_db(
+        MarkovDB.from_counts(counts, sparse=sparse, lazy=lazy, **pruning),
+        method=method,
+        samples=samples,
+        seed=seed,
+    )
+    if method == "removal":
+        effects = attribution.removal_effects
+    else:
+        effects = attribution.shapley_values
+
+    return (
+        attribution.full_probability,
+        effects,
+        attribution.df_info.to_dict("list"),
+        attribution.bucketed_mass,
+    )
+
+
+class SegmentedAttribution:
+    """
+    Attribution of each segment of a dataset
+
+    ...
+
+    The dataset is tokenised once, with the paths aggregated by segment,
+    against a channel and state numbering shared by all the segments. The
+    transition counts of every segment are then built in a single pass
+    (see TransitionCounts.split_paths) and each segment is solved on its
+    own chain, one after the other or in a process pool.
+
+    Parameters
+    ----------
+    dataset : list of dict, pandas dataframe, pyarrow table or iterator
+        Each row has to have the path, conversion, value and group_by
+        fields. An iterator of chunks is read one chunk at a time
+    var_path : str
+        Name of the path field
+    var_conv : str
+        Name of the conversion field
+    var_value : str
+        Name of the value field
+    separator : str
+        The path separator for each column (' > ' for example) that
+        indicates the customer journey
+    group_by : str or list of str
+        Name of the field, or fields, that define the segments
+    sparse : bool
+        If True, the chains are solved in sparse mode (see MarkovDB)
+    var_count : str, optional
+        Name of the field with the number of journeys each row stands for
+    n_jobs : int
+        Number of worker processes that solve the segments
+    order : int
+        Order of the Markov chains
+    method : str
+        'removal' or 'shapley' (see MarkovAttribution)
+    samples : int, optional
+        Number of sampled permutations for method='shapley'
+    seed : int, optional
+        Seed of the sampled permutations
+    min_count, top_k, groups : optional
+        Pruning of the rare channels of each segment (see MarkovDB)
+    lazy : bool
+        If True, the chains are only solved for the states that the
+        removals need (see MarkovDB)
+
+    Atributes
+    ---------
+    segments : list
+        Sorted values of group_by (tuples if it is a list), with the
+        missing values as None, last
+    counts : dict
+        Transition counts of each segment
+    full_probabilities : dict
+        Probability to go from 'START' to 'CONVERSION' in each segment
+    effects : dict
+        Removal effect or Shapley value of each channel in each segment
+    bucketed_mass : dict
+        Fraction of the transition counts of each segment from or to a
+        state with a pruned channel
+    df_info : pandas dataframe
+        Conversions and value attributed to each channel in each segment,
+        in long format with one column per group_by field. pandas is only
+        imported when it is first accessed
+    """
+
+    def __init__(
+        self,
+        dataset,
+        var_path,
+        var_conv,
+        var_value,
+        separator,
+        group_by,
+        sparse=False,
+        var_count=None,
+        n_jobs=1,
+        order=1,
+        method="removal",
+        samples=None,
+        seed=None,
+        min_count=None,
+        top_k=None,
+        groups=None,
+        lazy=False,
+    ):
+
+        self.var_path = var_path
+        self.var_conv = var_conv
+        self.var_value = var_value
+        self.separator = separator
+        self.group_by = group_by
+        self.sparse = sparse
+        self.lazy = lazy
+        self.var_count = var_count
+        self.n_jobs = n_jobs
+        self.order = order
+        self.method = method
+        self.samples = samples
+        self.seed = seed
+        self.min_count = min_count
+        self.top_k = top_k
+        self.groups = groups
+        self.counts = {}
+        self.__vocabulary = TransitionCounts(
+            var_path, var_conv, var_value, separator, var_count, order
+        )
+
+        if isinstance(dataset, Iterator):
+            for chunk in dataset:
+                self.__add_chunk(chunk)
+        else:
+            self.__add_chunk(dataset)
+
+        self.segments = sort_segments(self.counts)
+        self.__attribute()
+
+    def __add_chunk(self, chunk):
+        """
+        Adds the transition counts of each segment of a chunk of data
+        """
+        paths = EncodedPaths(
+            chunk,
+            self.var_path,
+            self.var_conv,
+            self.var_value,
+            self.separator,
+            self.var_count,
+            var_group=self.group_by,
+        )
+        split = self.__vocabulary.split_paths(paths)
+        for segment, counts in zip(paths.segments, split):
+            if segment in self.counts:
+                self.counts[segment].merge(counts)
+            else:
+                self.counts[segment] = counts
+
+    def __attribute(self):
+        """
+        Solves the chain of every segment
+        """
+        if self.method not in ["removal", "shapley"]:
+            raise ValueError("Unknown method: {}".format(self.method))
+
+        args = (
+            [self.counts[segment] for segment in self.segments],
+            repeat(self.sparse),
+            repeat(self.lazy),
+            repeat(self.method),
+            repeat(self.samples),
+            repeat(self.seed),
+            repeat(
+                {
+                    "min_count": self.min_count,
+                    "top_k": self.top_k,
+                    "groups": self.groups,
+                }
+            ),
+        )
+        if self.n_jobs == 1:
+            results = list(map(_attribute_segment, *args))
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+
+            chunk_size = max(1, -(-len(self.segments) // (4 * self.n_jobs)))
+            with ProcessPoolExecutor(max_workers=self.n_jobs) as executor:
+                results = list(
+                    executor.map(
+                        _attribute_segment, *args, chunksize=chunk_size
+                    )
+                )
+
+        self.full_probabilities = {}
+        self.effects = {}
+        self.bucketed_mass = {}
+        self.__info = []
+        for segment, (probability, effects, info, bucketed_mass) in zip(
+            self.segments, results
+        ):
+            self.full_probabilities[segment] = probability
+            self.effects[segment] = effects
+            self.bucketed_mass[segment] = bucketed_mass
+            self.__info.append(info)
+        self.__df_info = None
+
+    @property
+    def df_info(self):
+        # pandas is only imported when the dataframe is first requested
+        if self.__df_info is None:
+            import pandas as pd
+
+            if isinstance(self.group_by, str):
+                fields = [self.group_by]
+                keys = [(segment,) for segment in self.segments]
+            else:
+                fields = list(self.group_by)
+                keys = self.segments
+
+            columns = [
+                "channel_name",
+                "total_conversion",
+                "total_conversion_value",
+            ]
+            data = {field: [] for field in fields + columns}
+            for key, info in zip(keys, self.__info):
+                rows = len(info["channel_name"])
+                for field, value in zip(fields, key):
+                    data[field] += [value] * rows
+                for column in columns:
+                    data[column] += info[column]
+
+            self.__df_info = pd.DataFrame(data=data)
+        return self.__df_info
@@ -0,0 +1,706 @@
+from copy import copy, deepcopy
+import hashlib
+import json
+import re
+import struct
+import zipfile
+
+import numpy as np
+
+from .EncodedPaths import EncodedPaths, pack_states
+
+
+def _load_npz(file, mmap):
+    """
+    Returns a dictionary with the arrays of an uncompressed .npz file. With
+    mmap=True the arrays are memory mapped from the file instead of read,
+    which np.load does not do for .npz files
+    """
+    if not mmap:
+        with np.load(file, allow_pickle=False) as npz:
+            return {name: npz[name] for name in npz.files}
+
+    arrays = {}
+    with zipfile.ZipFile(file) as archive, open(file, "rb") as f:
+        for info in archive.infolist():
+            name = info.filename[: -len(".npy")]
+
+            # The array data starts after the local header of the member,
+            # which has a 30 bytes fixed part, the name and an extra field,
+            # and after the header of the .npy format
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack("<HH", f.read(4))
+            f.seek(name_length + extra_length, 1)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                header = np.lib.format.read_array_header_1_0(f)
+            else:
+                header = np.lib.format.read_array_header_2_0(f)
+            shape, fortran_order, dtype = header
+
+            if info.compress_type != zipfile.ZIP_STORED or not all(shape):
+                with archive.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(
+                        member, allow_pickle=False
+                    )
+            else:
+                arrays[name] = np.memmap(
+                    file,
+                    dtype=dtype,
+                    mode="r",
+                    offset=f.tell(),
+                    shape=shape,
+                    order="F" if fortran_order else "C",
+                )
+
+    return arrays
+
+
+class TransitionCounts:
+    """
+    Transition counts of a Markov chain
+
+    ...
+
+    Accumulates the unnormalised transition counts, the conversions and the
+    value of a chain from one or more chunks of data. Only the counts are
+    kept, so the chunks can be read one at a time and dropped.
+
+    Counts built separately (one per shard of data, for instance) can be
+    merged by adding them, even when they found different channels, and
+    converted to and from plain dictionaries to be sent between processes
+    or stored.
+
+    Parameters
+    ----------
+    var_path : str
+        Name of the path field
+    var_conv : str
+        Name of the conversion field
+    var_value : str
+        Name of the value field
+    separator : str
+        The path separator for each column (' > ' for example) that
+        indicates the customer journey
+    var_count : str, optional
+        Name of the field with the number of journeys each row stands for
+    order : int
+        Order of the Markov chain
+
+    Atributes
+    ---------
+    channels : list of str
+        Channels in the order they were found
+    states : numpy array
+        Channels of each state, one row per state, given by their position
+        in channels plus one, oldest first and padded with 0
+    rows, cols, weights : numpy array
+        Transition counts in coordinate form. 0 is 'START', 1 is 'NULL',
+        2 is 'CONVERSION' and 3 + i is the i-th row of states
+    total_conversions : int
+        Number of conversions
+    total_value : float
+        Total value of the conversions
+
+    Methods
+    -------
+    partial_fit(chunk)
+        Adds the transitions of a chunk of data
+    add_paths(paths)
+        Adds the transitions of already encoded paths
+    split_paths(paths)
+        Returns the counts of each segment of grouped encoded paths
+    get_path_transitions(paths)
+        Returns the transitions of each of the encoded paths
+    merge(other)
+        Adds the counts of another TransitionCounts object
+    subtract(other)
+        Removes the counts of another TransitionCounts object
+    get_channel_visits()
+        Returns the number of visits to each channel
+    get_weight(channels)
+        Returns the count of the transitions that involve some channels
+    rename(mapping)
+        Returns the counts with some channels renamed or merged
+    prune(min_count, top_k, groups, other)
+        Returns the counts with the rare channels merged into buckets
+    to_dict()
+        Returns the counts as a dictionary of plain Python values
+    from_dict(d)
+        Returns the TransitionCounts object stored in a dictionary
+    save(file)
+        Stores the counts in a .npz file
+    load(file, mmap)
+        Returns the TransitionCounts object stored in a .npz file
+    get_transitions()
+        Returns the channels, the states and the transition counts in the
+        layout used by MarkovDB
+    fingerprint()
+        Returns a hash of the counts, conversions and value
+    """
+
+    def __init__(
+        self,
+        var_path,
+        var_conv,
+        var_value,
+        separator,
+        var_count=None,
+        order=1,
+    ):
+
+        self.var_path = var_path
+        self.var_conv = var_conv
+        self.var_value = var_value
+        self.separator = separator
+        self.var_count = var_count
+        self.order = order
+        self.channels = []
+        self.channel_to_code = {}
+        self.states = np.zeros((0, order), dtype=np.int64)
+        self.__state_index = None
+        self.rows = np.zeros(0, dtype=np.int64)
+        self.cols = np.zeros(0, dtype=np.int64)
+        self.weights = np.zeros(0)
+        self.total_conversions = 0
+        self.total_value = 0
+
+    def __get_channel_codes(self, channels):
+        """
+        Returns the code of each channel, adding the new ones
+        """
+        for channel in channels:
+            if channel not in self.channel_to_code:
+                self.channels.append(channel)
+                self.channel_to_code[channel] = len(self.channels)
+
+        return [self.channel_to_code[channel] for channel in channels]
+
+    def __get_state_index(self):
+        """
+        Returns the base the states are packed in (see pack_states), their
+        sorted keys and the id of each key. It is built on first use, so
+        loaded counts do not pay for it, and again when new channels change
+        the base
+        """
+        base = len(self.channels) + 2
+        if self.__state_index is None or self.__state_index[0] != base:
+            keys = pack_states(self.states, base)
+            by_key = np.argsort(keys)
+            self.__state_index = base, keys[by_key], by_key + 3
+
+        return self.__state_index
+
+    def __get_state_ids(self, states):
+        """
+        Returns a numpy array with the id of each state (a row of channel
+        codes), adding the new ones
+        """
+        base, keys, ids = self.__get_state_index()
+        state_keys = pack_states(states, base)
+
+        positions = np.searchsorted(keys, state_keys)
+        positions[positions == len(keys)] = 0
+        found = (
+            keys[positions] == state_keys
+            if len(keys)
+            else np.zeros(len(state_keys), dtype=bool)
+        )
+        state_ids = np.empty(len(state_keys), dtype=np.int64)
+        state_ids[found] = ids[positions[found]]
+
+        if not found.all():
+            new_keys, first, inverse = np.unique(
+                state_keys[~found], return_index=True, return_inverse=True
+            )
+            state_ids[~found] = 3 + len(self.states) + inverse
+            self.states = np.vstack([self.states, states[~found][first]])
+
+            # The new keys are merged into the sorted ones
+            keys = np.concatenate([keys, new_keys])
+            ids = np.concatenate([ids, state_ids[~found][first]])
+            by_key = np.argsort(keys, kind="stable")
+            self.__state_index = base, keys[by_key], ids[by_key]
+
+        return state_ids
+
+    def add(self, rows, cols, weights):
+        """
+        Adds transition counts given in coordinate form
+        """
+        keys = np.concatenate(
+            [self.rows * 2**32 + self.cols, rows * 2**32 + cols]
+        )
+        keys, inverse = np.unique(keys, return_inverse=True)
+
+        self.rows = keys >> 32
+        self.cols = keys & (2**32 - 1)
+        self.weights = np.bincount(
+            inverse,
+            weights=np.concatenate([self.weights, weights]),
+            minlength=len(keys),
+        )
+
+    def partial_fit(self, chunk):
+        """
+        Adds the transitions, conversions and value of a chunk of data,
+        which can be a list of dict, a pandas dataframe or a pyarrow table
+        or record batch
+        """
+        paths = EncodedPaths(
+            chunk,
+            self.var_path,
+            self.var_conv,
+            self.var_value,
+            self.separator,
+            self.var_count,
+        )
+
+        return self.add_paths(paths)
+
+    def __get_path_lookup(self, paths):
+        """
+        Returns the ids of this object for the local states of an
+        EncodedPaths object, adding the channels and states that are new
+        """
+        # Local channel codes to codes of this object. States never
+        # contain the local 'NULL' code
+        codes = np.array(
+            [0] + self.__get_channel_codes(paths.channels) + [0],
+            dtype=np.int64,
+        )
+        keys, _ = paths.get_states(self.order)
+        state_ids = self.__get_state_ids(
+            codes[paths.unpack(keys, self.order)]
+        )
+
+        return np.concatenate([[0], state_ids, [1, 2]]).astype(np.int64)
+
+    def add_paths(self, paths):
+        """
+        Adds the transitions, conversions and value of an EncodedPaths
+        object
+        """
+        lookup = self.__get_path_lookup(paths)
+        from_states, to_states, path = paths.get_transitions(self.order)
+        self.add(lookup[from_states], lookup[to_states], paths.counts[path])
+
+        self.total_conversions += paths.conversions.sum().item()
+        self.total_value += paths.values.sum().item()
+
+        return self
+
+    def split_paths(self, paths):
+        """
+        Returns a list with a new TransitionCounts object for each segment
+        of an EncodedPaths object built with var_group, in the order of
+        paths.segments. The transitions of every segment are counted in
+        a single pass over the paths. The channels and states are numbered
+        as in this object, which gains the new ones, and each segment then
+        keeps only the channels and states it uses
+        """
+        if paths.groups is None:
+            raise ValueError("The paths are not grouped (see var_group)")
+
+        lookup = self.__get_path_lookup(paths)
+        from_states, to_states, path = paths.get_transitions(self.order)
+        num_ids = len(self.states) + 3
+        num_segments = len(paths.segments)
+
+        # One key per segment and transition, sorted by segment
+        keys, inverse = np.unique(
+            (paths.groups[path] * num_ids + lookup[from_states]) * num_ids
+            + lookup[to_states],
+            return_inverse=True,
+        )
+        weights = np.bincount(
+            inverse, weights=paths.counts[path], minlength=len(keys)
+        )
+        segments = keys // num_ids**2
+        bounds = np.searchsorted(segments, np.arange(num_segments + 1))
+        conversions = np.bincount(
+            paths.groups, weights=paths.conversions, minlength=num_segments
+        ).astype(paths.conversions.dtype)
+        values = np.bincount(
+            paths.groups, weights=paths.values, minlength=num_segments
+        ).astype(paths.values.dtype)
+
+        split = []
+        for i in range(num_segments):
+            counts = TransitionCounts(
+                self.var_path,
+                self.var_conv,
+                self.var_value,
+                self.separator,
+                self.var_count,
+                self.order,
+            )
+            counts.channels = list(self.channels)
+            counts.states = self.states
+            segment_keys = keys[bounds[i] : bounds[i + 1]]
+            counts.rows = segment_keys // num_ids % num_ids
+            counts.cols = segment_keys % num_ids
+            counts.weights = weights[bounds[i] : bounds[i + 1]]
+            counts.total_conversions = conversions[i].item()
+            counts.total_value = values[i].item()
+            counts.__compact()
+            split.append(counts)
+
+        return split
+
+    def get_path_transitions(self, paths):
+        """
+        Returns the transitions of an EncodedPaths object that was already
+        added, between the indexes of the transition matrix of MarkovDB
+        (see get_transitions), and the path each transition belongs to
+        """
+        lookup = self.__get_layout()[2][self.__get_path_lookup(paths)]
+        from_states, to_states, path = paths.get_transitions(self.order)
+
+        return lookup[from_states], lookup[to_states], path
+
+    def merge(self, other):
+        """
+        Adds the counts, conversions and value of another TransitionCounts
+        object of the same order. Its channels and states are mapped to
+        the ones of this object, adding the ones that are missing
+        """
+        if other.order != self.order:
+            raise ValueError(
+                "Cannot merge counts of order {} and {}".format(
+                    self.order, other.order
+                )
+            )
+
+        codes = np.array(
+            [0] + self.__get_channel_codes(other.channels), dtype=np.int64
+        )
+        state_ids = self.__get_state_ids(codes[other.states])
+
+        lookup = np.concatenate([[0, 1, 2], state_ids]).astype(np.int64)
+        self.add(lookup[other.rows], lookup[other.cols], other.weights)
+
+        self.total_conversions += other.total_conversions
+        self.total_value += other.total_value
+
+        return self
+
+    def subtract(self, other):
+        """
+        Removes the counts, conversions and value of another
+        TransitionCounts object that was added before. Transitions whose
+        count drops to zero are dropped, together with the states and
+        channels that are no longer used
+        """
+        negative = deepcopy(other)
+        negative.weights = -negative.weights
+        negative.total_conversions = -negative.total_conversions
+        negative.total_value = -negative.total_value
+        self.merge(negative)
+
+        keep = ~np.isclose(self.weights, 0)
+        self.rows = self.rows[keep]
+        self.cols = self.cols[keep]
+        self.weights = self.weights[keep]
+        self.__compact()
+
+        return self
+
+    def __compact(self):
+        """
+        Drops the states and channels that no transition uses and numbers
+        the remaining ones again
+        """
+        used_ids = np.union1d(self.rows, self.cols)
+        used_states = used_ids[used_ids >= 3] - 3
+        used_channels = np.unique(self.states[used_states])
+        used_channels = used_channels[used_channels > 0]
+
+        recode = np.zeros(len(self.channels) + 1, dtype=np.int64)
+        recode[used_channels] = np.arange(1, len(used_channels) + 1)
+        self.channels = [self.channels[c - 1] for c in used_channels]
+        self.channel_to_code = {
+            channel: i + 1 for i, channel in enumerate(self.channels)
+        }
+
+        lookup = np.zeros(len(self.states) + 3, dtype=np.int64)
+        lookup[:3] = [0, 1, 2]
+        lookup[used_states + 3] = np.arange(3, len(used_states) + 3)
+        self.states = recode[self.states[used_states]]
+        self.__state_index = None
+        self.rows = lookup[self.rows]
+        self.cols = lookup[self.cols]
+
+    def get_channel_visits(self):
+        """
+        Returns a numpy array with the number of transitions into a state
+        that ends with each channel, in the order of channels
+        """
+        into = np.bincount(
+            self.cols, weights=self.weights, minlength=len(self.states) + 3
+        )
+        # The latest channel of a state is in its last column
+        return np.bincount(
+            self.states[:, -1],
+            weights=into[3:],
+            minlength=len(self.channels) + 1,
+        )[1:]
+
+    def get_weight(self, channels):
+        """
+        Returns the total count of the transitions from or to a state that
+        contains any of the channels
+        """
+        codes = [self.channel_to_code[channel] for channel in channels]
+        contains = np.zeros(len(self.states) + 3, dtype=bool)
+        contains[3:] = np.isin(self.states, codes).any(axis=1)
+
+        return self.weights[contains[self.rows] | contains[self.cols]].sum()
+
+    def rename(self, mapping):
+        """
+        Returns a new TransitionCounts object with the channels renamed by
+        a dictionary. Channels renamed to the same name, or to the name of
+        another channel, are merged together with their states and
+        transitions, as if the paths had been renamed before counting
+        """
+        renamed = copy(self)
+        renamed.channels = [
+            mapping.get(channel, channel) for channel in self.channels
+        ]
+        counts = TransitionCounts(
+            self.var_path,
+            self.var_conv,
+            self.var_value,
+            self.separator,
+            self.var_count,
+            self.order,
+        )
+
+        return counts.merge(renamed)
+
+    def prune(self, min_count=None, top_k=None, groups=None, other="OTHER"):
+        """
+        Returns a new TransitionCounts object where the channels visited
+        fewer than min_count times (see get_channel_visits), or outside of
+        the top_k most visited ones, are merged into buckets, and a
+        dictionary with the bucket of each of those channels.
+
+        groups is an optional dictionary of bucket names and regular
+        expressions: a pruned channel goes to the first bucket whose
+        expression it matches (see re.search), or to other
+        """
+        visits = self.get_channel_visits()
+        keep = np.ones(len(self.channels), dtype=bool)
+        if min_count is not None:
+            keep &= visits >= min_count
+        if top_k is not None:
+            # Most visited first, ties broken by name
+            by_visits = sorted(
+                range(len(self.channels)),
+                key=lambda i: (-visits[i], self.channels[i]),
+            )
+            keep[by_visits[top_k:]] = False
+
+        patterns = [
+            (bucket, re.compile(pattern))
+            for bucket, pattern in (groups or {}).items()
+        ]
+        buckets = {}
+        for i in np.flatnonzero(~keep).tolist():
+            channel = self.channels[i]
+            buckets[channel] = next(
+                (
+                    bucket
+                    for bucket, pattern in patterns
+                    if pattern.search(channel)
+                ),
+                other,
+            )
+
+        if not buckets:
+            return deepcopy(self), buckets
+
+        return self.rename(buckets), buckets
+
+    def __add__(self, other):
+        return deepcopy(self).merge(other)
+
+    def __sub__(self, other):
+        return deepcopy(self).subtract(other)
+
+    def __radd__(self, other):
+        # Lets sum() start from 0
+        if other == 0:
+            return deepcopy(self)
+        return other.__add__(self)
+
+    def to_dict(self):
+        """
+        Returns the counts as a dictionary of plain Python values, which
+        can be serialised as JSON
+        """
+        return {
+            "var_path": self.var_path,
+            "var_conv": self.var_conv,
+            "var_value": self.var_value,
+            "separator": self.separator,
+            "var_count": self.var_count,
+            "order": self.order,
+            "channels": list(self.channels),
+            "states": self.states.tolist(),
+            "rows": self.rows.tolist(),
+            "cols": self.cols.tolist(),
+            "weights": self.weights.tolist(),
+            "total_conversions": self.total_conversions,
+            "total_value": self.total_value,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        """
+        Returns the TransitionCounts object stored in a dictionary created
+        with to_dict
+        """
+        counts = cls(
+            d["var_path"],
+            d["var_conv"],
+            d["var_value"],
+            d["separator"],
+            d["var_count"],
+            d["order"],
+        )
+        counts.channels = list(d["channels"])
+        counts.channel_to_code = {
+            channel: i + 1 for i, channel in enumerate(counts.channels)
+        }
+        counts.states = np.array(d["states"], dtype=np.int64).reshape(
+            (-1, counts.order)
+        )
+        counts.__state_index = None
+        counts.rows = np.array(d["rows"], dtype=np.int64)
+        counts.cols = np.array(d["cols"], dtype=np.int64)
+        counts.weights = np.array(d["weights"], dtype=float)
+        counts.total_conversions = d["total_conversions"]
+        counts.total_value = d["total_value"]
+
+        return counts
+
+    def save(self, file):
+        """
+        Stores the channels, the states, the transition counts and the
+        totals in an uncompressed .npz file, which load can memory map
+        """
+        meta = {
+            "var_path": self.var_path,
+            "var_conv": self.var_conv,
+            "var_value": self.var_value,
+            "separator": self.separator,
+            "var_count": self.var_count,
+            "order": self.order,
+            "total_conversions": self.total_conversions,
+            "total_value": self.total_value,
+        }
+        np.savez(
+            file,
+            meta=np.array(json.dumps(meta)),
+            channels=np.array(self.channels, dtype=str),
+            states=self.states,
+            rows=self.rows,
+            cols=self.cols,
+            weights=self.weights,
+        )
+
+    @classmethod
+    def load(cls, file, mmap=True):
+        """
+        Returns the TransitionCounts object stored in a .npz file created
+        with save. With mmap=True the states and counts are memory mapped
+        from the file, so only the parts that are used are read
+        """
+        arrays = _load_npz(file, mmap)
+        meta = json.loads(arrays["meta"].item())
+
+        counts = cls(
+            meta["var_path"],
+            meta["var_conv"],
+            meta["var_value"],
+            meta["separator"],
+            meta["var_count"],
+            meta["order"],
+        )
+        counts.channels = arrays["channels"].tolist()
+        counts.channel_to_code = {
+            channel: i + 1 for i, channel in enumerate(counts.channels)
+        }
+        counts.states = arrays["states"].reshape((-1, counts.order))
+        counts.__state_index = None
+        counts.rows = arrays["rows"]
+        counts.cols = arrays["cols"]
+        counts.weights = arrays["weights"]
+        counts.total_conversions = meta["total_conversions"]
+        counts.total_value = meta["total_value"]
+
+        return counts
+
+    def __get_layout(self):
+        """
+        Returns the sorted list of channels, the sorted keys of the states
+        and the index in the transition matrix of MarkovDB of each id
+        """
+        num_channels = len(self.channels)
+        num_states = len(self.states)
+
+        by_name = np.argsort(np.array(self.channels, dtype=object))
+        recode = np.zeros(num_channels + 1, dtype=np.int64)
+        recode[by_name + 1] = np.arange(1, num_channels + 1)
+
+        keys = pack_states(recode[self.states], num_channels + 2)
+        by_key = np.argsort(keys)
+
+        lookup = np.zeros(num_states + 3, dtype=np.int64)
+        lookup[1] = num_states + 1
+        lookup[2] = num_states + 2
+        lookup[3 + by_key] = np.arange(1, num_states + 1)
+
+        channels = ["START"]
+        channels += [self.channels[i] for i in by_name]
+        channels += ["NULL", "CONVERSION"]
+
+        return channels, keys[by_key], lookup
+
+    def get_transitions(self):
+        """
+        Returns the sorted list of channels including 'START', 'NULL' and
+        'CONVERSION', the sorted keys of the states (see
+        EncodedPaths.get_states) and the transition counts between the
+        indexes of the transition matrix of MarkovDB
+        """
+        channels, keys, lookup = self.__get_layout()
+
+        return (
+            channels,
+            keys,
+            lookup[self.rows],
+            lookup[self.cols],
+            self.weights,
+        )
+
+    def fingerprint(self):
+        """
+        Returns a hexadecimal hash of the counts, conversions and value,
+        which does not depend on the order the data was added in. Equal
+        counts give equal fingerprints, so it can be used as a cache key
+        """
+        channels, keys, rows, cols, weights = self.get_transitions()
+        by_index = np.lexsort((cols, rows))
+
+        h = hashlib.blake2b(digest_size=16)
+        h.update("\0".join(channels).encode())
+        h.update(np.int64(self.order).tobytes())
+        for array in [keys, rows[by_index], cols[by_index]]:
+            h.update(np.ascontiguousarray(array, dtype=np.int64).tobytes())
+        h.update(np.ascontiguousarray(weights[by_index], dtype=float))
+        h.update(repr((self.total_conversions, self.total_value)).encode())
+
+        return h.hexdigest()
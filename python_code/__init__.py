@@ -1,3 +1,10 @@
 from .MarkovAttribution import MarkovAttribution
 from .MarkovMatrix import MarkovMatrix
 from .MarkovDB import MarkovDB
+from .TransitionCounts import TransitionCounts
+from .RollingAttribution import RollingAttribution
+from .AttributionStats import AttributionStats
+from .ResultCache import ResultCache
+from .RandomWalks import RandomWalks
+from .SegmentedAttribution import SegmentedAttribution
+from .ChainQuery import ChainQuery
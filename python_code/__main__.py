@@ -0,0 +1,219 @@
+"""
+Command line attribution of CSV and Parquet files
+
+The input is read in chunks of --chunk-size rows (pandas for CSV, pyarrow
+for Parquet) that are tokenised column-wise and dropped once counted, so
+the file is read a single time and never turned into one Python object
+per row. The attribution is written as CSV, or Parquet if the output ends
+with .parquet, and the time and memory of each stage as JSON.
+
+    python -m python_code attribute journeys.csv --output attribution.csv \\
+        --stats stats.json --path-column path --separator " > "
+"""
+import argparse
+import json
+import os
+import sys
+
+from .AttributionStats import AttributionStats, stage
+from .MarkovAttribution import MarkovAttribution
+from .MarkovDB import MarkovDB
+from .SegmentedAttribution import SegmentedAttribution
+
+
+def read_chunks(file, columns, chunk_size, file_format=None):
+    """
+    Returns an iterator over the chunks of a CSV or Parquet file, with
+    only the given columns. The format is taken from the extension of the
+    file if it is not given
+    """
+    if file_format is None:
+        extension = os.path.splitext(file)[1].lower()
+        file_format = "parquet" if extension in [".parquet", ".pq"] else "csv"
+
+    if file_format == "parquet":
+        import pyarrow.parquet as pq
+
+        return pq.ParquetFile(file).iter_batches(
+            batch_size=chunk_size, columns=columns
+        )
+
+    import pandas as pd
+
+    return pd.read_csv(
+        file, usecols=columns, chunksize=chunk_size, dtype={columns[0]: str}
+    )
+
+
+def _timed(chunks, stats):
+    """
+    Yields the chunks, recording the time to read each one and the number
+    of rows read so far
+    """
+    chunks = iter(chunks)
+    rows = 0
+    while True:
+        with stage(stats, "read") as info:
+            chunk = next(chunks, None)
+            if chunk is not None:
+                rows += len(chunk)
+            info["rows"] = rows
+        if chunk is None:
+            return
+        yield chunk
+
+
+def _limit_memory(megabytes):
+    """
+    Limits the address space of the process, so going over the limit
+    raises MemoryError instead of swapping
+    """
+    import resource
+
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    resource.setrlimit(resource.RLIMIT_AS, (megabytes * 2**20, hard))
+
+
+def attribute(args):
+    """
+    Runs the attribution of a file and writes its results
+    """
+    if args.max_memory is not None:
+        _limit_memory(args.max_memory)
+
+    columns = [args.path_column, args.conversion_column, args.value_column]
+    if args.count_column is not None:
+        columns.append(args.count_column)
+    columns += args.group_by or []
+
+    stats = AttributionStats(trace_memory=args.trace_memory)
+    chunks = _timed(
+        read_chunks(args.input, columns, args.chunk_size, args.format),
+        stats,
+    )
+    options = {
+        "min_count": args.min_count,
+        "top_k": args.top_k,
+        "groups": dict(args.bucket or []) or None,
+    }
+
+    if args.group_by:
+        with stage(stats, "segments") as info:
+            segmented = SegmentedAttribution(
+                chunks,
+                args.path_column,
+                args.conversion_column,
+                args.value_column,
+                args.separator,
+                args.group_by,
+                sparse=args.sparse,
+                lazy=args.lazy,
+                var_count=args.count_column,
+                n_jobs=args.n_jobs,
+                order=args.order,
+                method=args.method,
+                samples=args.samples,
+                seed=args.seed,
+                **options,
+            )
+            info["segments"] = len(segmented.segments)
+            if args.min_count is not None or args.top_k is not None:
+                info["max_bucketed_mass"] = max(
+                    segmented.bucketed_mass.values(), default=0.0
+                )
+        df = segmented.df_info
+    else:
+        db = MarkovDB(
+            chunks,
+            args.path_column,
+            args.conversion_column,
+            args.value_column,
+            args.separator,
+            sparse=args.sparse,
+            lazy=args.lazy,
+            var_count=args.count_column,
+            order=args.order,
+            stats=stats,
+            **options,
+        )
+        attribution = MarkovAttribution.from_db(
+            db,
+            n_jobs=args.n_jobs,
+            method=args.method,
+            samples=args.samples,
+            seed=args.seed,
+        )
+        df = attribution.df_info
+
+    if args.output is None:
+        df.to_csv(sys.stdout, index=False)
+    elif args.output.endswith(".parquet"):
+        df.to_parquet(args.output, index=False)
+    else:
+        df.to_csv(args.output, index=False)
+
+    if args.stats is not None:
+        with open(args.stats, "w") as f:
+            json.dump(stats.to_dict(), f, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m python_code", description=__doc__.split("\n")[1]
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser(
+        "attribute", help="attribute the conversions of a file of journeys"
+    )
+    command.add_argument("input", help="CSV or Parquet file")
+    command.add_argument("--format", choices=["csv", "parquet"])
+    command.add_argument("--path-column", default="path")
+    command.add_argument("--conversion-column", default="conversion")
+    command.add_argument("--value-column", default="value")
+    command.add_argument(
+        "--count-column", help="number of journeys each row stands for"
+    )
+    command.add_argument("--separator", default=" > ")
+    command.add_argument(
+        "--group-by", nargs="+", help="attribute each segment on its own"
+    )
+    command.add_argument("--order", type=int, default=1)
+    command.add_argument("--sparse", action="store_true")
+    command.add_argument(
+        "--lazy",
+        action="store_true",
+        help="only solve for the states the removals need",
+    )
+    command.add_argument(
+        "--method", choices=["removal", "shapley"], default="removal"
+    )
+    command.add_argument("--samples", type=int)
+    command.add_argument("--seed", type=int)
+    command.add_argument("--min-count", type=int)
+    command.add_argument("--top-k", type=int)
+    command.add_argument(
+        "--bucket",
+        nargs=2,
+        action="append",
+        metavar=("NAME", "REGEX"),
+        help="bucket for the pruned channels that match REGEX",
+    )
+    command.add_argument("--n-jobs", type=int, default=1)
+    command.add_argument("--chunk-size", type=int, default=100000)
+    command.add_argument(
+        "--max-memory", type=int, help="memory limit of the process, in MB"
+    )
+    command.add_argument("--trace-memory", action="store_true")
+    command.add_argument(
+        "--output", help="CSV or Parquet file, stdout if not given"
+    )
+    command.add_argument("--stats", help="JSON file for the stage stats")
+    args = parser.parse_args(argv)
+
+    if args.command == "attribute":
+        attribute(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""
+Benchmark of the attribution pipeline on synthetic journeys
+
+Every stage of the pipeline is timed on its own, and run a second time
+under tracemalloc to report its peak memory, so the tracing does not
+distort the timings. The time to import the package in a new interpreter
+is measured too. Results are written as JSON to compare versions.
+
+    python -m python_code.benchmarks.run --rows 100000 --channels 500 \\
+        --output bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from ..EncodedPaths import EncodedPaths
+from ..MarkovAttribution import MarkovAttribution
+from ..MarkovDB import MarkovDB
+from ..TransitionCounts import TransitionCounts
+from .synthetic import generate_journeys
+
+# Maximum time to import the package on top of numpy, in seconds. It
+# takes about 0.05 s, so this catches a new eager import of a heavy module
+IMPORT_BUDGET = 0.1
+
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import numpy
+numpy_end = time.perf_counter()
+import python_code
+end = time.perf_counter()
+print(json.dumps({
+    "seconds": end - start,
+    "numpy_seconds": numpy_end - start,
+    "package_seconds": end - numpy_end,
+    "pandas_imported": "pandas" in sys.modules,
+    "scipy_imported": "scipy" in sys.modules,
+    "multiprocessing_imported": "multiprocessing" in sys.modules,
+    "asyncio_imported": "asyncio" in sys.modules,
+}))
+"""
+
+VAR_PATH = "path"
+VAR_CONV = "conversion"
+VAR_VALUE = "value"
+SEPARATOR = " > "
+
+
+def pipeline(dataset, order=1, sparse=False, n_jobs=1):
+    """
+    Yields the name of each stage of the attribution pipeline after
+    running it
+    """
+    # The channels are found while the paths are parsed and encoded
+    paths = EncodedPaths(dataset, VAR_PATH, VAR_CONV, VAR_VALUE, SEPARATOR)
+    yield "parse"
+
+    paths.get_states(order)
+    yield "states"
+
+    counts = TransitionCounts(
+        VAR_PATH, VAR_CONV, VAR_VALUE, SEPARATOR, order=order
+    ).add_paths(paths)
+    yield "count"
+
+    db = MarkovDB.from_counts(counts, sparse=sparse, lazy=True)
+    db.transition_matrix
+    yield "matrix"
+
+    db.markov_matrix.m
+    yield "solve"
+
+    channels = db.unique_channels[1:-2]
+    db.get_removal_probabilities(
+        "START", "CONVERSION", [[c] for c in channels], n_jobs=n_jobs
+    )
+    yield "removal"
+
+    MarkovAttribution(
+        dataset,
+        VAR_PATH,
+        VAR_CONV,
+        VAR_VALUE,
+        SEPARATOR,
+        sparse=sparse,
+        n_jobs=n_jobs,
+        order=order,
+    )
+    yield "attribution"
+
+
+def baseline_transitions(dataset):
+    """
+    Counts the transitions of a list of dict one path at a time, the way
+    MarkovDB did before the paths were encoded. It is the reference of
+    measure_records
+    """
+    paths = []
+    for row in dataset:
+        end = "CONVERSION" if row[VAR_CONV] > 0 else "NULL"
+        paths.append(["START"] + row[VAR_PATH].split(SEPARATOR) + [end])
+
+    channels = set()
+    for row in dataset:
+        channels.update(row[VAR_PATH].split(SEPARATOR))
+    channels -= {"", "NULL"}
+    states = ["START"] + sorted(channels) + ["NULL", "CONVERSION"]
+    state_to_key = {state: i for i, state in enumerate(states)}
+
+    counts = np.zeros((len(states), len(states)))
+    for path in paths:
+        for i, state in enumerate(path[:-1]):
+            if state != "NULL":
+                counts[state_to_key[state], state_to_key[path[i + 1]]] += 1
+
+    return counts
+
+
+def measure_records(dataset, repeat=1):
+    """
+    Returns the best time over repeat runs to encode a list of dict and
+    get its transitions, and the same for baseline_transitions
+    """
+    seconds = np.inf
+    baseline_seconds = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        EncodedPaths(
+            dataset, VAR_PATH, VAR_CONV, VAR_VALUE, SEPARATOR
+        ).get_transitions()
+        end = time.perf_counter()
+        baseline_transitions(dataset)
+        baseline_end = time.perf_counter()
+        seconds = min(seconds, end - start)
+        baseline_seconds = min(baseline_seconds, baseline_end - end)
+
+    return {"seconds": seconds, "baseline_seconds": baseline_seconds}
+
+
+def measure(dataset, repeat=1, **options):
+    """
+    Returns a dictionary with the best time over repeat runs and the peak
+    memory of each stage of the pipeline
+    """
+    stages = {}
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for stage in pipeline(dataset, **options):
+            end = time.perf_counter()
+            seconds = stages.setdefault(stage, {}).get("seconds", np.inf)
+            stages[stage]["seconds"] = min(seconds, end - start)
+            start = time.perf_counter()
+
+    tracemalloc.start()
+    try:
+        for stage in pipeline(dataset, **options):
+            peak = tracemalloc.get_traced_memory()[1]
+            stages[stage]["peak_memory_bytes"] = peak
+            tracemalloc.reset_peak()
+    finally:
+        tracemalloc.stop()
+
+    return stages
+
+
+def measure_import():
+    """
+    Returns a dictionary with the time to import the package in a new
+    interpreter, split into numpy and the package itself, and whether
+    pandas, scipy, multiprocessing and asyncio were imported with it
+    """
+    root = os.path.dirname(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT],
+        cwd=root,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+
+    return json.loads(output)
+
+
+def run_benchmark(
+    rows,
+    channels,
+    mean_length=4.0,
+    length_distribution="geometric",
+    conversion_rate=0.05,
+    skew=1.0,
+    order=1,
+    sparse=False,
+    n_jobs=1,
+    repeat=1,
+    seed=0,
+):
+    """
+    Returns the benchmark results for a synthetic dataset as a dictionary
+    that can be serialised as JSON
+    """
+    params = {
+        "rows": rows,
+        "channels": channels,
+        "mean_length": mean_length,
+        "length_distribution": length_distribution,
+        "conversion_rate": conversion_rate,
+        "skew": skew,
+        "order": order,
+        "sparse": sparse,
+        "n_jobs": n_jobs,
+        "repeat": repeat,
+        "seed": seed,
+    }
+    dataset = generate_journeys(
+        rows,
+        channels,
+        mean_length=mean_length,
+        length_distribution=length_distribution,
+        conversion_rate=conversion_rate,
+        skew=skew,
+        separator=SEPARATOR,
+        seed=seed,
+    )
+    stages = measure(
+        dataset, repeat=repeat, order=order, sparse=sparse, n_jobs=n_jobs
+    )
+
+    return {
+        "params": params,
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+        },
+        "import": measure_import(),
+        "records": measure_records(dataset, repeat=repeat),
+        "stages": stages,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--channels", type=int, default=100)
+    parser.add_argument("--mean-length", type=float, default=4.0)
+    parser.add_argument(
+        "--length-distribution",
+        choices=["geometric", "poisson", "fixed"],
+        default="geometric",
+    )
+    parser.add_argument("--conversion-rate", type=float, default=0.05)
+    parser.add_argument("--skew", type=float, default=1.0)
+    parser.add_argument("--order", type=int, default=1)
+    parser.add_argument("--sparse", action="store_true")
+    parser.add_argument("--n-jobs", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--output", help="JSON file for the results, stdout if not given"
+    )
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(
+        args.rows,
+        args.channels,
+        mean_length=args.mean_length,
+        length_distribution=args.length_distribution,
+        conversion_rate=args.conversion_rate,
+        skew=args.skew,
+        order=args.order,
+        sparse=args.sparse,
+        n_jobs=args.n_jobs,
+        repeat=args.repeat,
+        seed=args.seed,
+    )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
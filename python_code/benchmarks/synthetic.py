@@ -0,0 +1,65 @@
+import numpy as np
+
+
+def generate_journeys(
+    rows,
+    channels,
+    mean_length=4.0,
+    length_distribution="geometric",
+    conversion_rate=0.05,
+    skew=1.0,
+    separator=" > ",
+    seed=0,
+):
+    """
+    Returns a list of dict with synthetic customer journeys, with the
+    'path', 'conversion' and 'value' keys used in the examples
+
+    Parameters
+    ----------
+    rows : int
+        Number of journeys
+    channels : int
+        Number of distinct channels, named 'C0', 'C1', ...
+    mean_length : float
+        Mean number of touchpoints per journey
+    length_distribution : str
+        'geometric', 'poisson' or 'fixed'. Every journey has at least one
+        touchpoint
+    conversion_rate : float
+        Probability of a journey to convert
+    skew : float
+        Exponent of the Zipf-like popularity of the channels, 0 makes all
+        channels equally likely
+    separator : str
+        Separator between the touchpoints of a path
+    seed : int
+        Seed of the random generator
+    """
+    rng = np.random.default_rng(seed)
+
+    if length_distribution == "geometric":
+        lengths = rng.geometric(1 / max(mean_length, 1), size=rows)
+    elif length_distribution == "poisson":
+        lengths = 1 + rng.poisson(max(mean_length - 1, 0), size=rows)
+    elif length_distribution == "fixed":
+        lengths = np.full(rows, max(int(round(mean_length)), 1))
+    else:
+        raise ValueError(
+            "Unknown length distribution: {}".format(length_distribution)
+        )
+
+    popularity = 1 / np.arange(1, channels + 1) ** skew
+    touchpoints = rng.choice(
+        channels, size=int(lengths.sum()), p=popularity / popularity.sum()
+    )
+    names = np.array(["C{}".format(i) for i in range(channels)], dtype=object)
+    paths = np.split(names[touchpoints], np.cumsum(lengths)[:-1])
+
+    conversions = (rng.random(rows) < conversion_rate).astype(int)
+    values = np.round(rng.lognormal(5, 1, size=rows) * conversions, 2)
+
+    return [
+        {"path": separator.join(path), "conversion": c, "value": v}
+        for path, c, v in zip(paths, conversions.tolist(), values.tolist())
+    ]
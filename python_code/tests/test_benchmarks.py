@@ -0,0 +1,58 @@
+import json
+import unittest
+from python_code.benchmarks.run import (
+    IMPORT_BUDGET,
+    measure_import,
+    measure_records,
+    run_benchmark,
+)
+from python_code.benchmarks.synthetic import generate_journeys
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_generator(self):
+        test = generate_journeys(500, 20, conversion_rate=0.5, seed=1)
+        self.assertTrue(len(test) == 500)
+        channels = {c for row in test for c in row["path"].split(" > ")}
+        self.assertTrue(channels <= {"C{}".format(i) for i in range(20)})
+        conversions = sum(row["conversion"] for row in test)
+        self.assertTrue(150 < conversions < 350)
+        comp = generate_journeys(500, 20, conversion_rate=0.5, seed=1)
+        self.assertTrue(test == comp)
+
+    def test_run_benchmark(self):
+        test = run_benchmark(200, 10, conversion_rate=0.3, order=2)
+        comp = [
+            "parse",
+            "states",
+            "count",
+            "matrix",
+            "solve",
+            "removal",
+            "attribution",
+        ]
+        self.assertTrue(list(test["stages"]) == comp)
+        for stage in test["stages"].values():
+            self.assertTrue(stage["seconds"] >= 0)
+            self.assertTrue(stage["peak_memory_bytes"] >= 0)
+        self.assertTrue(test["import"]["seconds"] > 0)
+        json.dumps(test)
+
+    def test_records(self):
+        # Encoding a list of dict must not be slower than counting the
+        # transitions one path at a time
+        dataset = generate_journeys(20000, 200, mean_length=6.0)
+        test = measure_records(dataset, repeat=3)
+        self.assertTrue(test["seconds"] < test["baseline_seconds"])
+
+    def test_import(self):
+        test = measure_import()
+        self.assertFalse(test["pandas_imported"])
+        self.assertFalse(test["scipy_imported"])
+        self.assertFalse(test["multiprocessing_imported"])
+        self.assertFalse(test["asyncio_imported"])
+        self.assertTrue(test["package_seconds"] < IMPORT_BUDGET)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+from numpy import allclose, all as np_all
+from python_code import MarkovAttribution, MarkovDB
+
+test_data = [
+    {"conversion": 1, "value": 1000.00, "path": "C1 > C2 > C3"},
+    {"conversion": 0, "value": 0, "path": "C1"},
+    {"conversion": 0, "value": 0, "path": "C2 > C3"},
+    {"conversion": 1, "value": 250.00, "path": "C3 > C1 > C3 > C2"},
+    {"conversion": 0, "value": 0, "path": "C2 > C2 > C4"},
+    {"conversion": 1, "value": 50.00, "path": "C4 > C1"},
+]
+
+sep = " > "
+
+
+class TestBootstrap(unittest.TestCase):
+    def test_replicates(self):
+        test_db = MarkovDB(
+            test_data * 50,
+            "path",
+            "conversion",
+            "value",
+            sep,
+            keep_paths=True,
+        )
+        channel_sets = [["C1"], ["C2", "C4"], []]
+        probabilities, removals, conversions, values = (
+            test_db.get_bootstrap_probabilities(
+                "START", "CONVERSION", channel_sets, 200, seed=0
+            )
+        )
+        self.assertTrue(removals.shape == (200, 3))
+        self.assertTrue(allclose(removals[:, 2], probabilities))
+
+        # Replicates are centred on the data
+        full = test_db.get_probability("START", "CONVERSION")
+        self.assertTrue(abs(probabilities.mean() - full) < 0.02)
+        self.assertTrue(abs(conversions.mean() - 150) < 3)
+        self.assertTrue(abs(values.mean() - 65000) < 2000)
+        removal = test_db.get_removal_probability(
+            "START", "CONVERSION", ["C1"]
+        )
+        self.assertTrue(abs(removals[:, 0].mean() - removal) < 0.02)
+
+    def test_quantiles(self):
+        marka = MarkovAttribution(
+            test_data * 20,
+            "path",
+            "conversion",
+            "value",
+            sep,
+            bootstrap=300,
+            seed=0,
+        )
+        df = marka.df_info
+        self.assertTrue(marka.bootstrap_conversions.shape == (300, 4))
+        self.assertTrue(
+            np_all(df["total_conversion_q0.025"] <= df["total_conversion"])
+        )
+        self.assertTrue(
+            np_all(df["total_conversion"] <= df["total_conversion_q0.975"])
+        )
+        self.assertTrue(
+            np_all(
+                df["total_conversion_value_q0.025"]
+                <= df["total_conversion_value_q0.975"]
+            )
+        )
+
+        comp = MarkovAttribution(
+            test_data * 20, "path", "conversion", "value", sep
+        )
+        self.assertTrue(
+            allclose(df["total_conversion"], comp.df_info["total_conversion"])
+        )
+
+    def test_without_paths(self):
+        test_db = MarkovDB(test_data, "path", "conversion", "value", sep)
+        with self.assertRaises(ValueError):
+            test_db.get_bootstrap_probabilities(
+                "START", "CONVERSION", [["C1"]], 10
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+from numpy import allclose
+from python_code import MarkovAttribution, ResultCache, TransitionCounts
+
+test_data = [
+    {"conversion": 1, "value": 1000.00, "path": "C1 > C2 > C3"},
+    {"conversion": 0, "value": 0, "path": "C5"},
+    {"conversion": 0, "value": 0, "path": "C2 > C3"},
+    {"conversion": 1, "value": 250.00, "path": "C3 > C1 > C3 > C2"},
+    {"conversion": 0, "value": 0, "path": "C2 > C2 > C4"},
+    {"conversion": 1, "value": 50.00, "path": "C4 > C1 > C2"},
+    {"conversion": 0, "value": 0, "path": "C1"},
+]
+
+sep = " > "
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = ResultCache(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_fingerprint(self):
+        # Same counts added in a different order
+        counts = TransitionCounts("path", "conversion", "value", sep)
+        counts.partial_fit(test_data)
+        comp = TransitionCounts("path", "conversion", "value", sep)
+        comp.partial_fit(test_data[3:]).partial_fit(test_data[:3])
+        self.assertTrue(counts.fingerprint() == comp.fingerprint())
+
+        comp.partial_fit(test_data[:1])
+        self.assertTrue(counts.fingerprint() != comp.fingerprint())
+
+    def test_hit(self):
+        comp = MarkovAttribution(
+            test_data, "path", "conversion", "value", sep, cache=self.cache
+        )
+        self.assertTrue(len(os.listdir(self.tmp.name)) == 1)
+
+        test = MarkovAttribution(
+            test_data, "path", "conversion", "value", sep, cache=self.cache
+        )
+        self.assertTrue(test.full_probability == comp.full_probability)
+        self.assertTrue(test.removal_effects == comp.removal_effects)
+        self.assertTrue(
+            allclose(
+                test.df_info["total_conversion"],
+                comp.df_info["total_conversion"],
+            )
+        )
+
+        # Other options or data are different entries
+        MarkovAttribution(
+            test_data,
+            "path",
+            "conversion",
+            "value",
+            sep,
+            order=2,
+            cache=self.cache,
+        )
+        MarkovAttribution(
+            test_data[1:], "path", "conversion", "value", sep, cache=self.cache
+        )
+        self.assertTrue(len(os.listdir(self.tmp.name)) == 3)
+
+    def test_eviction(self):
+        for i in range(5):
+            self.cache.put(str(i), {"data": bytes(1000)})
+            path = os.path.join(self.tmp.name, "{}.pkl".format(i))
+            os.utime(path, (i, i))
+        self.cache.max_bytes = 2500
+        self.cache.put("5", {"data": bytes(1000)})
+        self.assertTrue(len(os.listdir(self.tmp.name)) == 2)
+        self.assertTrue(self.cache.get("5") is not None)
+        self.assertTrue(self.cache.get("0") is None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import json
+import os
+import tempfile
+import unittest
+import pandas as pd
+from numpy import allclose
+from python_code import MarkovAttribution
+from python_code.__main__ import main
+
+test_data = [
+    {"conversion": 1, "value": 1000.00, "path": "C1 > C2 > C3"},
+    {"conversion": 0, "value": 0, "path": "C5"},
+    {"conversion": 0, "value": 0, "path": "C2 > C3"},
+    {"conversion": 1, "value": 250.00, "path": "C3 > C1 > C3 > C2"},
+    {"conversion": 0, "value": 0, "path": "C2 > C2 > C4"},
+    {"conversion": 1, "value": 50.00, "path": "C4 > C1 > C2"},
+    {"conversion": 0, "value": 0, "path": "C1"},
+]
+
+sep = " > "
+
+
+class TestCommandLine(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.input = os.path.join(self.tmp.name, "journeys.csv")
+        pd.DataFrame(test_data).rename(columns={"path": "journey"}).to_csv(
+            self.input, index=False
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_attribute(self):
+        output = os.path.join(self.tmp.name, "attribution.csv")
+        stats = os.path.join(self.tmp.name, "stats.json")
+        main(
+            [
+                "attribute",
+                self.input,
+                "--path-column",
+                "journey",
+                "--chunk-size",
+                "3",
+                "--output",
+                output,
+                "--stats",
+                stats,
+            ]
+        )
+
+        test = pd.read_csv(output)
+        comp = MarkovAttribution(
+            test_data, "path", "conversion", "value", sep
+        ).df_info
+        self.assertTrue(test["channel_name"].equals(comp["channel_name"]))
+        self.assertTrue(
+            allclose(test["total_conversion"], comp["total_conversion"])
+        )
+
+        with open(stats) as f:
+            stages = json.load(f)["stages"]
+        self.assertTrue(stages["read"]["rows"] == len(test_data))
+        self.assertTrue(stages["parse"]["calls"] == 3)
+        self.assertTrue("removal" in stages)
+
+    def test_parquet(self):
+        parquet = os.path.join(self.tmp.name, "journeys.parquet")
+        pd.read_csv(self.input).to_parquet(parquet)
+        output = os.path.join(self.tmp.name, "attribution.parquet")
+        stats = os.path.join(self.tmp.name, "stats.json")
+        main(
+            [
+                "attribute",
+                parquet,
+                "--path-column",
+                "journey",
+                "--top-k",
+                "2",
+                "--output",
+                output,
+                "--stats",
+                stats,
+            ]
+        )
+
+        test = pd.read_parquet(output)
+        self.assertTrue(list(test["channel_name"]) == ["C1", "C2", "OTHER"])
+        self.assertTrue(allclose(test["total_conversion"].sum(), 3))
+        with open(stats) as f:
+            prune = json.load(f)["stages"]["prune"]
+        self.assertTrue(0 < prune["bucketed_mass"] < 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import json
+import unittest
+import pandas as pd
+from numpy import allclose, isclose
+from python_code import MarkovDB, MarkovAttribution
+from python_code.TransitionCounts import TransitionCounts
+
+test_data = [
+    {"conversion": 1, "value": 1000.00, "path": "C1 > C2 > C3"},
+    {"conversion": 0, "value": 0, "path": "C1"},
+    {"conversion": 0, "value": 0, "path": "C2 > C3"},
+    {"conversion": 1, "value": 250.00, "path": "C3 > C1 > C3 > C2"},
+    {"conversion": 0, "value": 0, "path": "C2 > C2 > C4"},
+    {"conversion": 1, "value": 50.00, "path": "C4 > C1 > C2"},
+]
+
+sep = " > "
+
+
+def chunks(size):
+    for i in range(0, len(test_data), size):
+        yield test_data[i : i + size]
+
+
+class TestTransitionCounts(unittest.TestCase):
+    def test_partial_fit(self):
+        test = TransitionCounts("path", "conversion", "value", sep)
+        for chunk in chunks(2):
+            test.partial_fit(chunk)
+        self.assertTrue(test.channels == ["C1", "C2", "C3", "C4"])
+        self.assertTrue(test.total_conversions == 3)
+        self.assertTrue(test.total_value == 1300)
+        # START -> C1 happens twice, START is 0 and C1 is 3
+        start_c1 = (test.rows == 0) & (test.cols == 3)
+        self.assertTrue(test.weights[start_c1].tolist() == [2])
+
+    def test_chunked_db(self):
+        for order in [1, 2]:
+            comp_db = MarkovDB(
+                test_data, "path", "conversion", "value", sep, order=order
+            )
+            test_db = MarkovDB(
+                chunks(4), "path", "conversion", "value", sep, order=order
+            )
+            self.assertTrue(comp_db.unique_channels == test_db.unique_channels)
+            self.assertTrue(
+                allclose(comp_db.transition_matrix, test_db.transition_matrix)
+            )
+
+    def test_repeated_states(self):
+        # States seen in an earlier chunk keep their id, also once a new
+        # channel changes how the states are packed
+        for order in [1, 3]:
+            test = TransitionCounts(
+                "path", "conversion", "value", sep, order=order
+            )
+            test.partial_fit(test_data[:4])
+            states = test.states.copy()
+            test.partial_fit(test_data[:4])
+            self.assertTrue((test.states == states).all())
+            test.partial_fit(test_data[4:])
+            self.assertTrue((test.states[: len(states)] == states).all())
+
+            comp = TransitionCounts(
+                "path", "conversion", "value", sep, order=order
+            ).partial_fit(test_data + test_data[:4])
+            self.assertTrue(len(test.states) == len(comp.states))
+            self.assertTrue(test.fingerprint() == comp.fingerprint())
+
+    def test_partial_fit_db(self):
+        test_db = MarkovDB(None, "path", "conversion", "value", sep)
+        test_db.partial_fit(test_data[:3])
+        self.assertTrue(
+            isclose(test_db.get_probability("START", "CONVERSION"), 1 / 3)
+        )
+        test_db.partial_fit(pd.DataFrame(test_data[3:]))
+        comp_db = MarkovDB(test_data, "path", "conversion", "value", sep)
+        self.assertTrue(
+            isclose(
+                comp_db.get_probability("START", "CONVERSION"),
+                test_db.get_probability("START", "CONVERSION"),
+            )
+        )
+
+    def test_attribution(self):
+        test_db = MarkovDB(chunks(1), "path", "conversion", "value", sep)
+        test = MarkovAttribution.from_db(test_db).df_info
+        comp = MarkovAttribution(
+            test_data, "path", "conversion", "value", sep
+        ).df_info
+        self.assertTrue(
+            allclose(comp["total_conversion"], test["total_conversion"])
+        )
+
+    def test_merge(self):
+        for order in [1, 2]:
+            shards = [
+                TransitionCounts(
+                    "path", "conversion", "value", sep, order=order
+                ).partial_fit(chunk)
+                for chunk in [test_data[4:], test_data[:2], test_data[2:4]]
+            ]
+            test_db = MarkovDB.from_counts(sum(shards))
+            comp_db = MarkovDB(
+                test_data, "path", "conversion", "value", sep, order=order
+            )
+            self.assertTrue(comp_db.unique_channels == test_db.unique_channels)
+            self.assertTrue(
+                allclose(comp_db.transition_matrix, test_db.transition_matrix)
+            )
+            self.assertTrue(comp_db.total_value == test_db.total_value)
+            # Merging does not modify the shards
+            self.assertTrue(shards[0].channels == ["C1", "C2", "C4"])
+
+    def test_merge_order(self):
+        first = TransitionCounts("path", "conversion", "value", sep)
+        second = TransitionCounts("path", "conversion", "value", sep, order=2)
+        with self.assertRaises(ValueError):
+            first.merge(second)
+
+    def test_dict(self):
+        comp = TransitionCounts(
+            "path", "conversion", "value", sep, order=2
+        ).partial_fit(test_data)
+        test = TransitionCounts.from_dict(
+            json.loads(json.dumps(comp.to_dict()))
+        )
+        test.partial_fit(test_data[:1])
+        comp.partial_fit(test_data[:1])
+        self.assertTrue(comp.to_dict() == test.to_dict())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+import unittest
+import pandas as pd
+from numpy import allclose, array_equal, isclose
+from python_code import MarkovDB
+from python_code.EncodedPaths import EncodedPaths
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+test_data = [
+    {"conversion": 1, "value": 1000.00, "path": "C1 > C2 > C3"},
+    {"conversion": 0, "value": 0, "path": "C1"},
+    {"conversion": 0, "value": 0, "path": "C2 > C3"},
+    {"conversion": 1, "value": 250.00, "path": "C3 > C1 > NULL > C2"},
+    {"conversion": 0, "value": 0, "path": "C2 > C2 > C10"},
+]
+
+sep = " > "
+
+
+class TestEncodedPaths(unittest.TestCase):
+    def test_codes(self):
+        test = EncodedPaths(test_data, "path", "conversion", "value", sep)
+        self.assertTrue(test.channels == ["C1", "C10", "C2", "C3"])
+        self.assertTrue(array_equal(test.lengths, [3, 1, 2, 4, 3]))
+        comp = [1, 3, 4, 1, 3, 4, 4, 1, 5, 3, 3, 3, 2]
+        self.assertTrue(array_equal(test.codes, comp))
+
+    def test_transitions(self):
+        test = EncodedPaths(test_data, "path", "conversion", "value", sep)
+        from_states, to_states, rows = test.get_transitions()
+        self.assertTrue(array_equal(from_states[:4], [0, 1, 3, 4]))
+        self.assertTrue(array_equal(to_states[:4], [1, 3, 4, 6]))
+        # Nothing leaves the NULL touchpoint of the fourth path
+        self.assertTrue(array_equal(from_states[rows == 3], [0, 4, 1, 3]))
+
+    def test_dataframe(self):
+        comp_db = MarkovDB(test_data, "path", "conversion", "value", sep)
+        test_db = MarkovDB(
+            pd.DataFrame(test_data), "path", "conversion", "value", sep
+        )
+        self.assertTrue(comp_db.unique_channels == test_db.unique_channels)
+        self.assertTrue(
+            allclose(comp_db.transition_matrix, test_db.transition_matrix)
+        )
+        self.assertTrue(comp_db.total_value == test_db.total_value)
+
+    def test_aggregation(self):
+        dataset = test_data + test_data[:2] + test_data[:1]
+        test = EncodedPaths(dataset, "path", "conversion", "value", sep)
+        self.assertTrue(array_equal(test.counts, [3, 2, 1, 1, 1]))
+        self.assertTrue(array_equal(test.conversions, [3, 0, 0, 1, 0]))
+        self.assertTrue(array_equal(test.values, [3000, 0, 0, 250, 0]))
+
+    def test_count_column(self):
+        dataset = test_data + test_data[:2] + test_data[:1]
+        comp_db = MarkovDB(dataset, "path", "conversion", "value", sep)
+        counted = [dict(row, n=1) for row in test_data]
+        counted[0] = dict(counted[0], n=3, conversion=3, value=3000.00)
+        counted[1] = dict(counted[1], n=2)
+        for data in [counted, pd.DataFrame(counted)]:
+            test_db = MarkovDB(
+                data, "path", "conversion", "value", sep, var_count="n"
+            )
+            self.assertTrue(
+                allclose(comp_db.transition_matrix, test_db.transition_matrix)
+            )
+            self.assertTrue(
+                comp_db.total_conversions == test_db.total_conversions
+            )
+
+    def test_mixed_count_column(self):
+        # 3 of the 10 journeys of the first row converted
+        counted = [
+            {"conversion": 3, "value": 30.0, "path": "a > b", "n": 10},
+            {"conversion": 0, "value": 0, "path": "b", "n": 10},
+        ]
+        dataset = (
+            [{"conversion": 1, "value": 10.0, "path": "a > b"}] * 3
+            + [{"conversion": 0, "value": 0, "path": "a > b"}] * 7
+            + [{"conversion": 0, "value": 0, "path": "b"}] * 10
+        )
+        comp_db = MarkovDB(dataset, "path", "conversion", "value", sep)
+        for data in [counted, pd.DataFrame(counted)]:
+            test_db = MarkovDB(
+                data, "path", "conversion", "value", sep, var_count="n"
+            )
+            self.assertTrue(
+                allclose(comp_db.transition_matrix, test_db.transition_matrix)
+            )
+            self.assertTrue(
+                allclose(test_db.get_probability("START", "CONVERSION"), 0.15)
+            )
+            self.assertTrue(test_db.total_value == 30)
+
+        with self.assertRaises(ValueError):
+            MarkovDB(
+                [dict(counted[0], conversion=11)],
+                "path",
+                "conversion",
+                "value",
+                sep,
+                var_count="n",
+            )
+
+    def test_empty_count_rows(self):
+        # Rows that stand for no journeys add no channel
+        counted = [dict(row, n=1) for row in test_data]
+        counted.append({"conversion": 0, "value": 0, "path": "D", "n": 0})
+        comp_db = MarkovDB(test_data, "path", "conversion", "value", sep)
+        datasets = [counted, pd.DataFrame(counted)]
+        if pa is not None:
+            datasets.append(pa.Table.from_pylist(counted))
+        for data in datasets:
+            test_db = MarkovDB(
+                data, "path", "conversion", "value", sep, var_count="n"
+            )
+            self.assertTrue(comp_db.unique_channels == test_db.unique_channels)
+            self.assertTrue(
+                isclose(
+                    comp_db.get_probability("START", "CONVERSION"),
+                    test_db.get_probability("START", "CONVERSION"),
+                )
+            )
+
+    @unittest.skipIf(pa is None, "pyarrow is not installed")
+    def test_arrow(self):
+        comp_db = MarkovDB(test_data, "path", "conversion", "value", sep)
+        test_db = MarkovDB(
+            pa.Table.from_pylist(test_data),
+            "path",
+            "conversion",
+            "value",
+            sep,
+        )
+        self.assertTrue(comp_db.unique_channels == test_db.unique_channels)
+        self.assertTrue(
+            allclose(comp_db.transition_matrix, test_db.transition_matrix)
+        )
+        self.assertTrue(comp_db.total_conversions == test_db.total_conversions)
+
+
+if __name__ == "__main__":
+    unittest.main()
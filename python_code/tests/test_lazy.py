@@ -0,0 +1,120 @@
+import unittest
+from numpy import array, allclose, isclose
+from python_code import MarkovAttribution, MarkovDB, MarkovMatrix
+
+test_values = array(
+    [
+        [0, 1 / 2, 0, 1 / 2, 0],
+        [1 / 2, 0, 1 / 2, 0, 0],
+        [0, 1 / 2, 0, 0, 1 / 2],
+        [0, 0, 0, 1, 0],
+        [0, 0, 0, 0, 1],
+    ]
+)
+
+test_data = [
+    {"conversion": 1, "value": 1000.00, "path": "C1 > C2 > C3"},
+    {"conversion": 0, "value": 0, "path": "C1"},
+    {"conversion": 0, "value": 0, "path": "C2 > C3"},
+]
+
+sep = " > "
+
+
+class TestLazy(unittest.TestCase):
+    def test_probability(self):
+        test_matrix = MarkovMatrix(test_values, lazy=True)
+        test = test_matrix.get_probability(0, 3)
+        self.assertTrue(isclose(test, 3 / 4))
+        test = test_matrix.get_probability(2, 4)
+        self.assertTrue(isclose(test, 3 / 4))
+
+    def test_n_m_on_access(self):
+        test_matrix = MarkovMatrix(test_values, lazy=True)
+        comp_matrix = MarkovMatrix(test_values)
+        self.assertTrue(allclose(comp_matrix.n, test_matrix.n))
+        self.assertTrue(allclose(comp_matrix.m, test_matrix.m))
+
+    def test_db(self):
+        for sparse in [False, True]:
+            test_db = MarkovDB(
+                test_data,
+                "path",
+                "conversion",
+                "value",
+                sep,
+                sparse=sparse,
+                lazy=True,
+            )
+            test = test_db.get_probability("START", "CONVERSION")
+            self.assertTrue(isclose(test, 1 / 3))
+            test = test_db.get_removal_probability(
+                "START", "CONVERSION", ["C1"]
+            )
+            self.assertTrue(isclose(test, 1 / 6))
+
+    def test_removals(self):
+        # Dense lazy removals never form n or m
+        comp_db = MarkovDB(test_data, "path", "conversion", "value", sep)
+        test_db = MarkovDB(
+            test_data, "path", "conversion", "value", sep, lazy=True
+        )
+        channel_sets = [["C1"], ["C2"], ["C1", "C3"], []]
+        for abs_state in ["CONVERSION", "NULL"]:
+            comp = comp_db.get_removal_probabilities(
+                "START", abs_state, channel_sets
+            )
+            test = test_db.get_removal_probabilities(
+                "START", abs_state, channel_sets
+            )
+            self.assertTrue(allclose(comp, test))
+            comp = comp_db.get_permutation_probabilities(
+                "START", abs_state, ["C3", "C1", "C2"]
+            )
+            test = test_db.get_permutation_probabilities(
+                "START", abs_state, ["C3", "C1", "C2"]
+            )
+            self.assertTrue(allclose(comp, test))
+        self.assertTrue(test_db.markov_matrix._MarkovMatrix__n is None)
+        self.assertTrue(test_db.markov_matrix._MarkovMatrix__m is None)
+
+    def test_attribution(self):
+        for method in ["removal", "shapley"]:
+            comp = MarkovAttribution(
+                test_data, "path", "conversion", "value", sep, method=method
+            )
+            test = MarkovAttribution(
+                test_data,
+                "path",
+                "conversion",
+                "value",
+                sep,
+                method=method,
+                lazy=True,
+            )
+            self.assertTrue(test.db.markov_matrix._MarkovMatrix__n is None)
+            self.assertTrue(
+                allclose(
+                    comp.df_info["total_conversion"],
+                    test.df_info["total_conversion"],
+                )
+            )
+
+    def test_derived_views(self):
+        marka = MarkovAttribution(
+            test_data, "path", "conversion", "value", sep
+        )
+        # The removal effects never build the labeled matrix
+        self.assertTrue(marka.db._MarkovDB__transition_matrix_df is None)
+        df = marka.db.transition_matrix_df
+        self.assertTrue(allclose(df.values, marka.db.transition_matrix))
+        self.assertTrue(marka.db.transition_matrix_df is df)
+
+        test_matrix = MarkovMatrix(test_values)
+        self.assertTrue(test_matrix._MarkovMatrix__m is None)
+        self.assertTrue(isclose(test_matrix.get_probability(0, 3), 3 / 4))
+        self.assertTrue(test_matrix._MarkovMatrix__n is None)
+
+
+if __name__ == "__main__":
+    unittest.main()
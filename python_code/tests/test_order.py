@@ -0,0 +1,111 @@
+import unittest
+import numpy as np
+from numpy import isclose
+from python_code import MarkovDB, MarkovAttribution
+
+test_data = [
+    {"conversion": 1, "value": 1000.00, "path": "C1 > C2 > C3"},
+    {"conversion": 0, "value": 0, "path": "C1"},
+    {"conversion": 0, "value": 0, "path": "C2 > C3"},
+    {"conversion": 1, "value": 250.00, "path": "C3 > C1 > C3 > C2"},
+    {"conversion": 0, "value": 0, "path": "C2 > C2 > C4"},
+    {"conversion": 1, "value": 50.00, "path": "C4 > C1 > C2"},
+]
+
+sep = " > "
+
+
+def reference_probability(order, removed=()):
+    """
+    START to CONVERSION probability of the chain of the given order, built
+    with tuples of channel names, where the states that contain a removed
+    channel go to NULL
+    """
+    counts = {}
+    for row in test_data:
+        channels = row["path"].split(sep)
+        states = ["START"] + [
+            tuple(channels[max(0, i - order + 1) : i + 1])
+            for i in range(len(channels))
+        ]
+        states.append("CONVERSION" if row["conversion"] > 0 else "NULL")
+        for a, b in zip(states[:-1], states[1:]):
+            if isinstance(b, tuple) and set(b) & set(removed):
+                b = "NULL"
+            counts.setdefault(a, {}).setdefault(b, 0)
+            counts[a][b] += 1
+
+    transient = sorted(counts, key=str)
+    index = {s: i for i, s in enumerate(transient)}
+    q = np.zeros((len(transient), len(transient)))
+    r = np.zeros(len(transient))
+    for a, row in counts.items():
+        total = sum(row.values())
+        for b, count in row.items():
+            if b == "CONVERSION":
+                r[index[a]] += count / total
+            elif b != "NULL":
+                q[index[a], index[b]] += count / total
+
+    x = np.linalg.solve(np.identity(len(transient)) - q, r)
+    return x[index["START"]]
+
+
+class TestOrder(unittest.TestCase):
+    def test_states(self):
+        test_db = MarkovDB(
+            test_data, "path", "conversion", "value", sep, order=2
+        )
+        names = test_db.transition_matrix_df.index.tolist()
+        self.assertTrue("C1 > C2" in names)
+        self.assertTrue("C2" in names)
+        self.assertTrue(len(names) == len(test_db.state_keys) + 3)
+
+    def test_probability(self):
+        for order in [1, 2, 3]:
+            test_db = MarkovDB(
+                test_data, "path", "conversion", "value", sep, order=order
+            )
+            test = test_db.get_probability("START", "CONVERSION")
+            comp = reference_probability(order)
+            self.assertTrue(isclose(comp, test))
+
+    def test_tuple_state(self):
+        test_db = MarkovDB(
+            test_data, "path", "conversion", "value", sep, order=2
+        )
+        test = test_db.get_probability(("C1", "C2"), "CONVERSION")
+        self.assertTrue(isclose(test, 3 / 4))
+        with self.assertRaises(KeyError):
+            test_db.get_probability(("C4", "C3"), "CONVERSION")
+
+    def test_removal(self):
+        for order in [2, 3]:
+            for sparse in [False, True]:
+                test_db = MarkovDB(
+                    test_data,
+                    "path",
+                    "conversion",
+                    "value",
+                    sep,
+                    sparse=sparse,
+                    order=order,
+                )
+                for channel in ["C1", "C2", "C3", "C4"]:
+                    test = test_db.get_removal_probability(
+                        "START", "CONVERSION", [channel]
+                    )
+                    comp = reference_probability(order, [channel])
+                    self.assertTrue(isclose(comp, test))
+
+    def test_attribution(self):
+        marka = MarkovAttribution(
+            test_data, "path", "conversion", "value", sep, order=2
+        )
+        comp = ["C1", "C2", "C3", "C4"]
+        self.assertTrue(marka.df_info["channel_name"].tolist() == comp)
+        self.assertTrue(isclose(marka.df_info["total_conversion"].sum(), 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
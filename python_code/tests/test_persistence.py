@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+from numpy import isclose, memmap
+from python_code import MarkovDB, TransitionCounts
+
+test_data = [
+    {"conversion": 1, "value": 1000.00, "path": "C1 > C2 > C3"},
+    {"conversion": 0, "value": 0, "path": "C1"},
+    {"conversion": 0, "value": 0, "path": "C2 > C3"},
+    {"conversion": 1, "value": 250.00, "path": "C3 > C1 > C3 > C2"},
+    {"conversion": 0, "value": 0, "path": "C2 > C2 > C4"},
+    {"conversion": 1, "value": 50.00, "path": "C4 > C1"},
+]
+
+sep = " > "
+
+
+class TestPersistence(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.file = os.path.join(self.tmp.name, "db.npz")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_save_load(self):
+        for order in [1, 2]:
+            comp_db = MarkovDB(
+                test_data, "path", "conversion", "value", sep, order=order
+            )
+            comp_db.save(self.file)
+            for mmap in [True, False]:
+                test_db = MarkovDB.load(self.file, mmap=mmap)
+                rows = test_db.counts.rows
+                self.assertTrue(isinstance(rows, memmap) == mmap)
+                self.assertTrue(test_db.order == order)
+                comp = comp_db.unique_channels
+                self.assertTrue(test_db.unique_channels == comp)
+                self.assertTrue(test_db.total_conversions == 3)
+                self.assertTrue(isclose(test_db.total_value, 1300))
+                comp = comp_db.get_removal_probability(
+                    "START", "CONVERSION", ["C3"]
+                )
+                test = test_db.get_removal_probability(
+                    "START", "CONVERSION", ["C3"]
+                )
+                self.assertTrue(isclose(comp, test))
+
+    def test_update_loaded(self):
+        MarkovDB(test_data[:3], "path", "conversion", "value", sep).save(
+            self.file
+        )
+        test_db = MarkovDB.load(self.file)
+        test_db.partial_fit(test_data[3:])
+        comp_db = MarkovDB(test_data, "path", "conversion", "value", sep)
+        self.assertTrue(
+            isclose(
+                comp_db.get_probability("START", "CONVERSION"),
+                test_db.get_probability("START", "CONVERSION"),
+            )
+        )
+
+    def test_empty(self):
+        TransitionCounts("path", "conversion", "value", sep).save(self.file)
+        test = TransitionCounts.load(self.file)
+        self.assertTrue(test.channels == [] and len(test.weights) == 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
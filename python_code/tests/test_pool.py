@@ -0,0 +1,56 @@
+import unittest
+from numpy import allclose
+from python_code import MarkovDB, MarkovAttribution
+
+test_data = [
+    {"conversion": 1, "value": 1000.00, "path": "C1 > C2 > C3"},
+    {"conversion": 0, "value": 0, "path": "C1"},
+    {"conversion": 0, "value": 0, "path": "C2 > C3"},
+    {"conversion": 1, "value": 250.00, "path": "C3 > C1 > C3 > C2"},
+    {"conversion": 0, "value": 0, "path": "C2 > C2 > C4"},
+    {"conversion": 1, "value": 50.00, "path": "C4 > C1"},
+]
+
+sep = " > "
+
+channel_sets = [["C4"], ["C1"], ["C3", "C2"], ["C2"], ["C3"]]
+
+
+class TestRemovalPool(unittest.TestCase):
+    def test_dense(self):
+        test_db = MarkovDB(test_data, "path", "conversion", "value", sep)
+        comp = test_db.get_removal_probabilities(
+            "START", "CONVERSION", channel_sets
+        )
+        test = test_db.get_removal_probabilities(
+            "START", "CONVERSION", channel_sets, n_jobs=2
+        )
+        self.assertTrue(allclose(comp, test))
+
+    def test_sparse(self):
+        test_db = MarkovDB(
+            test_data, "path", "conversion", "value", sep, sparse=True
+        )
+        comp = test_db.get_removal_probabilities(
+            "START", "CONVERSION", channel_sets
+        )
+        test = test_db.get_removal_probabilities(
+            "START", "CONVERSION", channel_sets, n_jobs=2
+        )
+        self.assertTrue(allclose(comp, test))
+
+    def test_attribution(self):
+        comp = MarkovAttribution(
+            test_data, "path", "conversion", "value", sep
+        ).df_info
+        test = MarkovAttribution(
+            test_data, "path", "conversion", "value", sep, n_jobs=2
+        ).df_info
+        self.assertTrue(list(comp["channel_name"]) == list(test["channel_name"]))
+        self.assertTrue(
+            allclose(comp["total_conversion"], test["total_conversion"])
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+from numpy import array, allclose
+from python_code import MarkovDB, MarkovMatrix
+
+test_values = array(
+    [
+        [0, 1 / 2, 0, 1 / 2, 0],
+        [1 / 2, 0, 1 / 2, 0, 0],
+        [0, 1 / 2, 0, 0, 1 / 2],
+        [0, 0, 0, 1, 0],
+        [0, 0, 0, 0, 1],
+    ]
+)
+
+test_data = [
+    {"conversion": 1, "value": 1000.00, "path": "C1 > C2 > C3"},
+    {"conversion": 0, "value": 0, "path": "C1"},
+    {"conversion": 0, "value": 0, "path": "C2 > C3"},
+    {"conversion": 1, "value": 50.00, "path": "C3 > C1"},
+]
+
+sep = " > "
+
+
+class TestProbabilities(unittest.TestCase):
+    def test_matrix(self):
+        for lazy in [False, True]:
+            test_matrix = MarkovMatrix(test_values, lazy=lazy)
+            test = test_matrix.get_probabilities([0, 2], 4)
+            self.assertTrue(allclose(test, [1 / 4, 3 / 4]))
+            test = test_matrix.get_probabilities()
+            comp = [[3 / 4, 1 / 4], [1 / 2, 1 / 2], [1 / 4, 3 / 4]]
+            self.assertTrue(allclose(test, comp))
+
+    def test_invalid_states(self):
+        test_matrix = MarkovMatrix(test_values)
+        with self.assertRaises(ValueError):
+            test_matrix.get_probability(3, 4)
+        with self.assertRaises(ValueError):
+            test_matrix.get_probability(0, 2)
+        with self.assertRaises(ValueError):
+            test_matrix.get_probabilities([0, 5], 4)
+        with self.assertRaises(TypeError):
+            test_matrix.get_probabilities(["C1"], 4)
+
+    def test_db(self):
+        for order in [1, 2]:
+            test_db = MarkovDB(
+                test_data, "path", "conversion", "value", sep, order=order
+            )
+            names = test_db.transition_matrix_df.index[:-2]
+            comp = [
+                test_db.get_probability(i, "CONVERSION")
+                for i in range(len(names))
+            ]
+            test = test_db.get_probabilities(abs_state="CONVERSION")
+            self.assertTrue(allclose(comp, test))
+
+            df = test_db.get_probabilities(frame=True)
+            self.assertTrue(list(df.index) == list(names))
+            self.assertTrue(allclose(df["CONVERSION"], comp))
+            self.assertTrue(allclose(df.sum(axis=1), 1))
+
+        test_db = MarkovDB(test_data, "path", "conversion", "value", sep)
+        test = test_db.get_probabilities(["START", 2], "CONVERSION")
+        comp = [
+            test_db.get_probability("START", "CONVERSION"),
+            test_db.get_probability("C2", "CONVERSION"),
+        ]
+        self.assertTrue(allclose(comp, test))
+        with self.assertRaises(KeyError):
+            test_db.get_probabilities(["C9"], "CONVERSION")
+
+
+if __name__ == "__main__":
+    unittest.main()
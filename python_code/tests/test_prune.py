@@ -0,0 +1,139 @@
+import unittest
+from numpy import allclose, isclose
+from python_code import (
+    AttributionStats,
+    MarkovAttribution,
+    MarkovDB,
+    SegmentedAttribution,
+    TransitionCounts,
+)
+
+test_data = [
+    {"conversion": 1, "value": 1000.00, "path": "C1 > C2 > C3"},
+    {"conversion": 0, "value": 0, "path": "C5"},
+    {"conversion": 0, "value": 0, "path": "C2 > C3"},
+    {"conversion": 1, "value": 250.00, "path": "C3 > C1 > C3 > C2"},
+    {"conversion": 0, "value": 0, "path": "C2 > C2 > C4"},
+    {"conversion": 1, "value": 50.00, "path": "C4 > C1 > C2"},
+    {"conversion": 0, "value": 0, "path": "X1 > C1"},
+]
+
+sep = " > "
+
+
+def rename_paths(data, buckets):
+    """
+    Returns the data with every channel replaced by its bucket
+    """
+    return [
+        dict(
+            row,
+            path=sep.join(
+                buckets.get(channel, channel)
+                for channel in row["path"].split(sep)
+            ),
+        )
+        for row in data
+    ]
+
+
+class TestPrune(unittest.TestCase):
+    def test_visits(self):
+        counts = TransitionCounts("path", "conversion", "value", sep)
+        counts.partial_fit(test_data)
+        visits = dict(zip(counts.channels, counts.get_channel_visits()))
+        comp = {"C1": 4, "C2": 6, "C3": 4, "C4": 2, "C5": 1, "X1": 1}
+        self.assertTrue(visits == comp)
+
+    def test_buckets(self):
+        for order in [1, 2]:
+            test = MarkovAttribution(
+                test_data,
+                "path",
+                "conversion",
+                "value",
+                sep,
+                order=order,
+                min_count=2,
+                groups={"X": "^X"},
+            )
+            buckets = test.db.buckets
+            self.assertTrue(buckets == {"C5": "OTHER", "X1": "X"})
+            self.assertTrue("OTHER" in test.channels)
+
+            # Same chain as renaming the paths before counting
+            comp = MarkovAttribution(
+                rename_paths(test_data, buckets),
+                "path",
+                "conversion",
+                "value",
+                sep,
+                order=order,
+            )
+            self.assertTrue(
+                isclose(test.full_probability, comp.full_probability)
+            )
+            self.assertTrue(
+                allclose(
+                    test.df_info["total_conversion"],
+                    comp.df_info["total_conversion"],
+                )
+            )
+            # START > C5, C5 > NULL, START > X1 and X1 > C1, and at order
+            # 2 also C1 after X1 > NULL
+            self.assertTrue(isclose(test.bucketed_mass, (3 + order) / 25))
+
+    def test_top_k(self):
+        test_db = MarkovDB(
+            test_data, "path", "conversion", "value", sep, top_k=3
+        )
+        comp = ["START", "C1", "C2", "C3", "OTHER", "NULL", "CONVERSION"]
+        self.assertTrue(test_db.unique_channels == comp)
+
+        # Nothing to prune
+        test_db = MarkovDB(
+            test_data, "path", "conversion", "value", sep, min_count=1
+        )
+        self.assertTrue(test_db.buckets == {})
+        self.assertTrue(test_db.bucketed_mass == 0)
+
+
+    def test_bucketed_mass(self):
+        stats = AttributionStats()
+        test_db = MarkovDB(
+            test_data,
+            "path",
+            "conversion",
+            "value",
+            sep,
+            min_count=2,
+            stats=stats,
+        )
+        comp = test_db.bucketed_mass
+        self.assertTrue(stats.stages["prune"]["bucketed_mass"] == comp)
+
+        # The last segment has no conversions and is not solved
+        data = [
+            dict(row, area="A" if i < 6 else "B")
+            for i, row in enumerate(test_data)
+        ]
+        test = SegmentedAttribution(
+            data, "path", "conversion", "value", sep, "area", min_count=2
+        )
+        for area in ["A", "B"]:
+            comp_db = MarkovDB(
+                [row for row in data if row["area"] == area],
+                "path",
+                "conversion",
+                "value",
+                sep,
+                min_count=2,
+            )
+            self.assertTrue(
+                isclose(test.bucketed_mass[area], comp_db.bucketed_mass)
+            )
+        self.assertTrue(test.bucketed_mass["B"] == 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
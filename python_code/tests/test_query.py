@@ -0,0 +1,96 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from numpy import isclose
+from python_code import ChainQuery, MarkovAttribution, MarkovDB
+
+test_data = [
+    {"conversion": 1, "value": 1000.00, "path": "C1 > C2 > C3"},
+    {"conversion": 0, "value": 0, "path": "C5"},
+    {"conversion": 0, "value": 0, "path": "C2 > C3"},
+    {"conversion": 1, "value": 250.00, "path": "C3 > C1 > C3 > C2"},
+    {"conversion": 0, "value": 0, "path": "C2 > C2 > C4"},
+    {"conversion": 1, "value": 50.00, "path": "C4 > C1 > C2"},
+    {"conversion": 0, "value": 0, "path": "C1"},
+]
+
+sep = " > "
+
+
+class TestChainQuery(unittest.TestCase):
+    def test_queries(self):
+        for sparse in [False, True]:
+            for order in [1, 2]:
+                test_db = MarkovDB(
+                    test_data,
+                    "path",
+                    "conversion",
+                    "value",
+                    sep,
+                    sparse=sparse,
+                    order=order,
+                )
+                query = ChainQuery(test_db)
+                comp = test_db.get_removal_probability(
+                    "START", "CONVERSION", ["C1", "C4"]
+                )
+                test = query.get_removal_probability(["C4", "C1"])
+                self.assertTrue(isclose(test, comp))
+                # The removed channels are absorbed in 'NULL'
+                test = query.get_removal_probability(
+                    ["C1", "C4"], abs_state="NULL"
+                )
+                self.assertTrue(isclose(test, 1 - comp))
+
+                full = test_db.get_probability("START", "CONVERSION")
+                self.assertTrue(query.full_probability == full)
+                self.assertTrue(query.get_removal_probability([]) == full)
+
+        marka = MarkovAttribution(
+            test_data, "path", "conversion", "value", sep
+        )
+        query = ChainQuery(marka.db)
+        for channel, effect in marka.removal_effects.items():
+            self.assertTrue(isclose(query.get_removal_effect(channel), effect))
+
+    def test_cache(self):
+        test_db = MarkovDB(test_data, "path", "conversion", "value", sep)
+        query = ChainQuery(test_db, max_cached=2)
+        query.get_removal_probability(["C1", "C2"])
+        query.get_removal_probability(["C2", "C1"])
+        self.assertTrue((query.hits, query.misses) == (1, 2))
+
+        # The full probability is the least recently used answer
+        query.get_removal_probability(["C3"])
+        query.get_probability()
+        self.assertTrue((query.hits, query.misses) == (1, 4))
+
+    def test_async(self):
+        channel_sets = [["C1"], ["C2", "C3"], ["C4"], ["C1"]]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            file = os.path.join(tmp, "db.npz")
+            test_db = MarkovDB(test_data, "path", "conversion", "value", sep)
+            test_db.save(file)
+
+            async def run(query):
+                return await asyncio.gather(
+                    *[
+                        query.get_removal_probability_async(channels)
+                        for channels in channel_sets
+                    ]
+                )
+
+            with ChainQuery.load(file) as query:
+                test = asyncio.run(run(query))
+
+        for channels, probability in zip(channel_sets, test):
+            comp = test_db.get_removal_probability(
+                "START", "CONVERSION", channels
+            )
+            self.assertTrue(isclose(probability, comp))
+
+
+if __name__ == "__main__":
+    unittest.main()
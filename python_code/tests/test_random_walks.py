@@ -0,0 +1,73 @@
+import unittest
+from numpy import all as np_all, array, isclose
+from python_code import MarkovDB, RandomWalks
+
+test_data = [
+    {"conversion": 1, "value": 1000.00, "path": "C1 > C2 > C3"},
+    {"conversion": 0, "value": 0, "path": "C1"},
+    {"conversion": 0, "value": 0, "path": "C2 > C3"},
+    {"conversion": 1, "value": 250.00, "path": "C3 > C1 > C3 > C2"},
+    {"conversion": 0, "value": 0, "path": "C2 > C2 > C4"},
+    {"conversion": 1, "value": 50.00, "path": "C4 > C1"},
+]
+
+sep = " > "
+
+
+class TestRandomWalks(unittest.TestCase):
+    def test_estimates(self):
+        for sparse in [False, True]:
+            for order in [1, 2]:
+                test_db = MarkovDB(
+                    test_data,
+                    "path",
+                    "conversion",
+                    "value",
+                    sep,
+                    sparse=sparse,
+                    order=order,
+                )
+                walks = test_db.get_random_walks(50000, seed=0)
+                full = test_db.get_probability("START", "CONVERSION")
+                self.assertTrue(
+                    abs(walks.conversion_probability - full)
+                    < 4 * walks.standard_error
+                )
+
+                channel_sets = [["C1"], ["C2", "C4"], []]
+                effects, errors = test_db.get_simulated_removal_effects(
+                    walks, channel_sets
+                )
+                comp = array(
+                    [
+                        1
+                        - test_db.get_removal_probability(
+                            "START", "CONVERSION", channels
+                        )
+                        / full
+                        for channels in channel_sets
+                    ]
+                )
+                self.assertTrue(
+                    np_all(abs(effects - comp) <= 4 * errors + 1e-9)
+                )
+                self.assertTrue(effects[2] == 0)
+
+    def test_seed(self):
+        test_db = MarkovDB(test_data, "path", "conversion", "value", sep)
+        comp = test_db.get_random_walks(1000, seed=1)
+        test = RandomWalks(test_db.transition_matrix, 1000, seed=1)
+        self.assertTrue(test.conversions == comp.conversions)
+        self.assertTrue(np_all(test.visits == comp.visits))
+
+    def test_max_step(self):
+        test_db = MarkovDB(test_data, "path", "conversion", "value", sep)
+        walks = test_db.get_random_walks(1000, seed=0, max_step=1)
+        # No path converts in a single step from START
+        self.assertTrue(walks.steps == 1)
+        self.assertTrue(walks.conversions == 0)
+        self.assertTrue(isclose(walks.truncated / 1000, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+import unittest
+from numpy import isclose
+from python_code import MarkovDB, MarkovAttribution
+
+test_data = [
+    {"conversion": 1, "value": 1000.00, "path": "C1 > C2 > C3"},
+    {"conversion": 0, "value": 0, "path": "C1"},
+    {"conversion": 0, "value": 0, "path": "C2 > C3"},
+    {"conversion": 1, "value": 250.00, "path": "C3 > C1 > C3 > C2"},
+    {"conversion": 0, "value": 0, "path": "C2 > C2 > C4"},
+    {"conversion": 1, "value": 50.00, "path": "C4 > C1"},
+]
+
+sep = " > "
+
+
+def rebuild_probability(channel):
+    """
+    Removal probability computed by rebuilding the whole chain
+    """
+    dataset = [
+        dict(row, path=row["path"].replace(channel, "NULL"))
+        for row in test_data
+    ]
+    db = MarkovDB(dataset, "path", "conversion", "value", sep)
+    return db.get_probability("START", "CONVERSION")
+
+
+class TestRemoval(unittest.TestCase):
+    def test_single_removal(self):
+        test_db = MarkovDB(test_data, "path", "conversion", "value", sep)
+        for channel in ["C1", "C2", "C3", "C4"]:
+            test = test_db.get_removal_probability(
+                "START", "CONVERSION", [channel]
+            )
+            comp = rebuild_probability(channel)
+            self.assertTrue(isclose(comp, test))
+
+    def test_set_removal(self):
+        test_db = MarkovDB(test_data, "path", "conversion", "value", sep)
+        dataset = [
+            dict(
+                row,
+                path=row["path"].replace("C1", "NULL").replace("C4", "NULL"),
+            )
+            for row in test_data
+        ]
+        comp_db = MarkovDB(dataset, "path", "conversion", "value", sep)
+        comp = comp_db.get_probability("START", "CONVERSION")
+        test = test_db.get_removal_probability(
+            "START", "CONVERSION", ["C1", "C4"]
+        )
+        self.assertTrue(isclose(comp, test))
+
+    def test_absorbing_states(self):
+        # The removed channels are replaced by 'NULL', so their mass is
+        # absorbed in 'NULL'
+        dataset = [
+            dict(
+                row,
+                path=row["path"].replace("C1", "NULL").replace("C4", "NULL"),
+            )
+            for row in test_data
+        ]
+        comp_db = MarkovDB(dataset, "path", "conversion", "value", sep)
+        for sparse in [False, True]:
+            test_db = MarkovDB(
+                test_data, "path", "conversion", "value", sep, sparse=sparse
+            )
+            for abs_state in ["CONVERSION", "NULL"]:
+                comp = comp_db.get_probability("START", abs_state)
+                test = test_db.get_removal_probability(
+                    "START", abs_state, ["C1", "C4"]
+                )
+                self.assertTrue(isclose(comp, test))
+                test = test_db.get_permutation_probabilities(
+                    "START", abs_state, ["C2", "C3", "C1", "C4"]
+                )
+                self.assertTrue(isclose(comp, test[2]))
+
+    def test_empty_removal(self):
+        test_db = MarkovDB(test_data, "path", "conversion", "value", sep)
+        comp = test_db.get_probability("START", "CONVERSION")
+        test = test_db.get_removal_probability("START", "CONVERSION", [])
+        self.assertTrue(isclose(comp, test))
+
+    def test_attribution(self):
+        marka = MarkovAttribution(
+            test_data, "path", "conversion", "value", sep
+        )
+        full = marka.full_probability
+        effects = {
+            c: 1 - rebuild_probability(c) / full
+            for c in ["C1", "C2", "C3", "C4"]
+        }
+        cumulative = sum(effects.values())
+        for _, row in marka.df_info.iterrows():
+            comp = effects[row["channel_name"]] / cumulative * 3
+            self.assertTrue(isclose(comp, row["total_conversion"]))
+
+    def test_overlapping_names(self):
+        # Removing C1 must not touch C10 or C1 Promo
+        dataset = [
+            {"conversion": 1, "value": 10.00, "path": "C1 > C10 > C2"},
+            {"conversion": 0, "value": 0, "path": "C10 > C1 Promo"},
+            {"conversion": 1, "value": 20.00, "path": "C1 Promo > C10"},
+            {"conversion": 0, "value": 0, "path": "C2 > C1"},
+            {"conversion": 1, "value": 5.00, "path": "C10"},
+        ]
+
+        def rename(name):
+            return [
+                dict(
+                    row,
+                    path=sep.join(
+                        name if c == "C1" else c
+                        for c in row["path"].split(sep)
+                    ),
+                )
+                for row in dataset
+            ]
+
+        test_db = MarkovDB(dataset, "path", "conversion", "value", sep)
+        comp_db = MarkovDB(rename("NULL"), "path", "conversion", "value", sep)
+        comp = comp_db.get_probability("START", "CONVERSION")
+        test = test_db.get_removal_probability("START", "CONVERSION", ["C1"])
+        self.assertTrue(isclose(comp, test))
+
+        for order in [1, 2]:
+            test_db = MarkovDB(
+                dataset, "path", "conversion", "value", sep, order=order
+            )
+            comp_db = MarkovDB(
+                rename("Z"), "path", "conversion", "value", sep, order=order
+            )
+            comp = comp_db.get_removal_probability(
+                "START", "CONVERSION", ["Z"]
+            )
+            test = test_db.get_removal_probability(
+                "START", "CONVERSION", ["C1"]
+            )
+            self.assertTrue(isclose(comp, test))
+
+
+if __name__ == "__main__":
+    unittest.main()
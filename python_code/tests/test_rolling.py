@@ -0,0 +1,73 @@
+import unittest
+from numpy import allclose, isclose
+from python_code import MarkovAttribution, RollingAttribution
+
+test_periods = {
+    "2020-01-01": [
+        {"conversion": 1, "value": 1000.00, "path": "C1 > C2 > C3"},
+        {"conversion": 0, "value": 0, "path": "C5"},
+    ],
+    "2020-01-02": [
+        {"conversion": 0, "value": 0, "path": "C2 > C3"},
+        {"conversion": 1, "value": 250.00, "path": "C3 > C1 > C3 > C2"},
+    ],
+    "2020-01-03": [
+        {"conversion": 0, "value": 0, "path": "C2 > C2 > C4"},
+        {"conversion": 1, "value": 50.00, "path": "C4 > C1 > C2"},
+        {"conversion": 0, "value": 0, "path": "C1"},
+    ],
+}
+
+sep = " > "
+
+
+class TestRollingAttribution(unittest.TestCase):
+    def test_window(self):
+        for order in [1, 2]:
+            rolling = RollingAttribution(
+                "path", "conversion", "value", sep, window=2, order=order
+            )
+            evicted = []
+            for period, chunk in test_periods.items():
+                evicted += rolling.add(period, chunk)
+            self.assertTrue(evicted == ["2020-01-01"])
+            comp = ["2020-01-02", "2020-01-03"]
+            self.assertTrue(list(rolling.periods) == comp)
+
+            comp = MarkovAttribution(
+                test_periods["2020-01-02"] + test_periods["2020-01-03"],
+                "path",
+                "conversion",
+                "value",
+                sep,
+                order=order,
+            )
+            self.assertTrue(
+                isclose(comp.full_probability, rolling.full_probability)
+            )
+            self.assertTrue(
+                comp.df_info["channel_name"].tolist()
+                == rolling.df_info["channel_name"].tolist()
+            )
+            self.assertTrue(
+                allclose(
+                    comp.df_info["total_conversion_value"],
+                    rolling.df_info["total_conversion_value"],
+                )
+            )
+
+    def test_evict_all(self):
+        rolling = RollingAttribution(
+            "path", "conversion", "value", sep, window=3
+        )
+        for period, chunk in test_periods.items():
+            rolling.add(period, chunk)
+        for period in list(test_periods):
+            rolling.evict(period)
+        self.assertTrue(rolling.counts.channels == [])
+        self.assertTrue(len(rolling.counts.weights) == 0)
+        self.assertTrue(rolling.counts.total_conversions == 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+import pandas as pd
+from numpy import allclose, isclose, nan
+from python_code import MarkovAttribution, SegmentedAttribution
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+test_data = [
+    {"conversion": 1, "value": 1000.00, "path": "C1 > C2 > C3", "area": "A"},
+    {"conversion": 0, "value": 0, "path": "C5", "area": "A"},
+    {"conversion": 0, "value": 0, "path": "C2 > C3", "area": "A"},
+    {"conversion": 1, "value": 250.00, "path": "C3 > C1 > C3", "area": "B"},
+    {"conversion": 0, "value": 0, "path": "C2 > C2 > C4", "area": "B"},
+    {"conversion": 1, "value": 50.00, "path": "C4 > C1 > C2", "area": "B"},
+    {"conversion": 0, "value": 0, "path": "C1", "area": "C"},
+]
+
+sep = " > "
+
+
+class TestSegmentedAttribution(unittest.TestCase):
+    def test_segments(self):
+        for order in [1, 2]:
+            test = SegmentedAttribution(
+                test_data,
+                "path",
+                "conversion",
+                "value",
+                sep,
+                "area",
+                order=order,
+            )
+            self.assertTrue(test.segments == ["A", "B", "C"])
+            df = test.df_info
+            for area in ["A", "B"]:
+                comp = MarkovAttribution(
+                    [row for row in test_data if row["area"] == area],
+                    "path",
+                    "conversion",
+                    "value",
+                    sep,
+                    order=order,
+                )
+                probability = test.full_probabilities[area]
+                self.assertTrue(isclose(probability, comp.full_probability))
+                segment = df[df["area"] == area]
+                self.assertTrue(
+                    list(segment["channel_name"])
+                    == list(comp.df_info["channel_name"])
+                )
+                self.assertTrue(
+                    allclose(
+                        segment["total_conversion_value"],
+                        comp.df_info["total_conversion_value"],
+                    )
+                )
+
+            # A segment without conversions attributes nothing
+            self.assertTrue(test.full_probabilities["C"] == 0)
+            self.assertTrue(
+                (df[df["area"] == "C"]["total_conversion"] == 0).all()
+            )
+
+    def test_fields(self):
+        data = [dict(row, day=i % 2) for i, row in enumerate(test_data)]
+        test = SegmentedAttribution(
+            iter([data[:3], data[3:]]),
+            "path",
+            "conversion",
+            "value",
+            sep,
+            ["area", "day"],
+        )
+        self.assertTrue(("A", 0) in test.segments)
+        columns = ["area", "day", "channel_name"]
+        self.assertTrue(list(test.df_info.columns[:3]) == columns)
+        self.assertTrue(isclose(test.df_info["total_conversion"].sum(), 3))
+
+
+    def test_missing_segments(self):
+        # Blank group fields are one segment, sorted last
+        data = [dict(row, area=None) for row in test_data[:3]]
+        data += test_data[3:]
+        datasets = [
+            iter([data[:2], data[2:]]),
+            pd.DataFrame(data).fillna({"area": nan}),
+        ]
+        if pa is not None:
+            datasets.append(pa.Table.from_pylist(data))
+        comp = MarkovAttribution(
+            test_data[:3], "path", "conversion", "value", sep
+        )
+        for dataset in datasets:
+            test = SegmentedAttribution(
+                dataset, "path", "conversion", "value", sep, "area"
+            )
+            self.assertTrue(test.segments == ["B", "C", None])
+            self.assertTrue(
+                isclose(test.full_probabilities[None], comp.full_probability)
+            )
+
+        data = [dict(row, day=i % 2) for i, row in enumerate(data)]
+        test = SegmentedAttribution(
+            data, "path", "conversion", "value", sep, ["area", "day"]
+        )
+        self.assertTrue(test.segments[-2:] == [(None, 0), (None, 1)])
+
+
+if __name__ == "__main__":
+    unittest.main()
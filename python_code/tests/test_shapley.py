@@ -0,0 +1,104 @@
+import unittest
+from itertools import permutations
+from numpy import isclose
+from python_code import MarkovAttribution, MarkovDB
+
+test_data = [
+    {"conversion": 1, "value": 1000.00, "path": "C1 > C2 > C3"},
+    {"conversion": 0, "value": 0, "path": "C1"},
+    {"conversion": 0, "value": 0, "path": "C2 > C3"},
+    {"conversion": 1, "value": 250.00, "path": "C3 > C1 > C3 > C2"},
+    {"conversion": 0, "value": 0, "path": "C2 > C2 > C4"},
+    {"conversion": 1, "value": 50.00, "path": "C4 > C1"},
+]
+
+sep = " > "
+
+
+def permutation_shapley_values(db):
+    """
+    Shapley values computed from every permutation of the channels
+    """
+    channels = db.unique_channels[1:-2]
+    values = dict.fromkeys(channels, 0)
+    orders = list(permutations(channels))
+    for order in orders:
+        for k, channel in enumerate(order):
+            with_channel = db.get_removal_probability(
+                "START", "CONVERSION", order[k + 1 :]
+            )
+            without_channel = db.get_removal_probability(
+                "START", "CONVERSION", order[k:]
+            )
+            values[channel] += (with_channel - without_channel) / len(orders)
+
+    return values
+
+
+class TestShapley(unittest.TestCase):
+    def test_permutation_probabilities(self):
+        for order in [1, 2]:
+            test_db = MarkovDB(
+                test_data, "path", "conversion", "value", sep, order=order
+            )
+            channels = ["C3", "C1", "C4", "C2"]
+            test = test_db.get_permutation_probabilities(
+                "START", "CONVERSION", channels
+            )
+            for k in range(len(channels) + 1):
+                comp = test_db.get_removal_probability(
+                    "START", "CONVERSION", channels[k:]
+                )
+                self.assertTrue(isclose(comp, test[k]))
+
+    def test_exact(self):
+        for order in [1, 2]:
+            marka = MarkovAttribution(
+                test_data,
+                "path",
+                "conversion",
+                "value",
+                sep,
+                order=order,
+                method="shapley",
+            )
+            comp = permutation_shapley_values(marka.db)
+            for channel, value in marka.shapley_values.items():
+                self.assertTrue(isclose(comp[channel], value))
+            self.assertTrue(
+                isclose(marka.df_info["total_conversion"].sum(), 3)
+            )
+
+    def test_sampled(self):
+        comp = MarkovAttribution(
+            test_data, "path", "conversion", "value", sep, method="shapley"
+        )
+        test = MarkovAttribution(
+            test_data,
+            "path",
+            "conversion",
+            "value",
+            sep,
+            method="shapley",
+            samples=2000,
+            seed=0,
+        )
+        for channel, value in comp.shapley_values.items():
+            self.assertTrue(
+                isclose(test.shapley_values[channel], value, atol=0.01)
+            )
+
+        again = MarkovAttribution.from_db(
+            test.db, method="shapley", samples=2000, seed=0
+        )
+        self.assertTrue(again.shapley_values == test.shapley_values)
+
+    def test_unknown_method(self):
+        with self.assertRaises(ValueError):
+            MarkovAttribution(
+                test_data, "path", "conversion", "value", sep, method="x"
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+from numpy import allclose, isclose
+from python_code import MarkovDB, MarkovAttribution
+
+test_data = [
+    {"conversion": 1, "value": 1000.00, "path": "C1 > C2 > C3"},
+    {"conversion": 0, "value": 0, "path": "C1"},
+    {"conversion": 0, "value": 0, "path": "C2 > C3"},
+    {"conversion": 1, "value": 250.00, "path": "C3 > C1 > C3 > C2"},
+    {"conversion": 0, "value": 0, "path": "C2 > C2 > C4"},
+    {"conversion": 1, "value": 50.00, "path": "C4 > C1"},
+]
+
+sep = " > "
+
+
+class TestSparse(unittest.TestCase):
+    def test_transition_matrix(self):
+        dense_db = MarkovDB(test_data, "path", "conversion", "value", sep)
+        sparse_db = MarkovDB(
+            test_data, "path", "conversion", "value", sep, sparse=True
+        )
+        comp = dense_db.transition_matrix
+        test = sparse_db.transition_matrix.toarray()
+        self.assertTrue(allclose(comp, test))
+
+    def test_probability(self):
+        dense_db = MarkovDB(test_data, "path", "conversion", "value", sep)
+        sparse_db = MarkovDB(
+            test_data, "path", "conversion", "value", sep, sparse=True
+        )
+        comp = dense_db.get_probability("START", "CONVERSION")
+        test = sparse_db.get_probability("START", "CONVERSION")
+        self.assertTrue(isclose(comp, test))
+
+    def test_removal_probability(self):
+        dense_db = MarkovDB(test_data, "path", "conversion", "value", sep)
+        sparse_db = MarkovDB(
+            test_data, "path", "conversion", "value", sep, sparse=True
+        )
+        for channels in [["C1"], ["C3"], ["C2", "C4"]]:
+            comp = dense_db.get_removal_probability(
+                "START", "CONVERSION", channels
+            )
+            test = sparse_db.get_removal_probability(
+                "START", "CONVERSION", channels
+            )
+            self.assertTrue(isclose(comp, test))
+
+    def test_attribution(self):
+        comp = MarkovAttribution(
+            test_data, "path", "conversion", "value", sep
+        ).df_info
+        test = MarkovAttribution(
+            test_data, "path", "conversion", "value", sep, sparse=True
+        ).df_info
+        self.assertTrue(
+            allclose(comp["total_conversion"], test["total_conversion"])
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
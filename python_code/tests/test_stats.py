@@ -0,0 +1,107 @@
+import json
+import unittest
+from numpy import allclose
+from python_code import AttributionStats, MarkovAttribution
+
+test_data = [
+    {"conversion": 1, "value": 1000.00, "path": "C1 > C2 > C3"},
+    {"conversion": 0, "value": 0, "path": "C5"},
+    {"conversion": 0, "value": 0, "path": "C2 > C3"},
+    {"conversion": 1, "value": 250.00, "path": "C3 > C1 > C3 > C2"},
+    {"conversion": 0, "value": 0, "path": "C2 > C2 > C4"},
+    {"conversion": 1, "value": 50.00, "path": "C4 > C1 > C2"},
+    {"conversion": 0, "value": 0, "path": "C1"},
+]
+
+sep = " > "
+
+
+class TestAttributionStats(unittest.TestCase):
+    def test_stages(self):
+        seen = []
+        stats = AttributionStats(
+            observers=[lambda name, record: seen.append(name)]
+        )
+        attribution = MarkovAttribution(
+            test_data, "path", "conversion", "value", sep, stats=stats
+        )
+        comp = MarkovAttribution(test_data, "path", "conversion", "value", sep)
+        self.assertTrue(
+            allclose(
+                attribution.df_info["total_conversion"],
+                comp.df_info["total_conversion"],
+            )
+        )
+
+        for name in ["parse", "count", "matrix", "solve", "removal"]:
+            self.assertTrue(stats.stages[name]["calls"] == 1)
+            self.assertTrue(stats.stages[name]["seconds"] >= 0)
+        self.assertTrue(stats.stages["matrix"]["size"] == 8)
+        self.assertTrue(stats.stages["removal"]["channel_sets"] == 5)
+        comp = ["C1", "C2", "C3", "C4", "C5"]
+        self.assertTrue(sorted(stats.channels) == comp)
+        self.assertTrue(seen[:2] == ["parse", "count"])
+        self.assertTrue(seen[-1] == "attribution")
+
+        d = json.loads(json.dumps(stats.to_dict()))
+        self.assertTrue(d["channels"]["C1"]["removed_states"] == 1)
+        self.assertTrue(d["channels"]["C1"]["solve_bytes"] == 8)
+        self.assertTrue(d["stages"]["removal"]["channels_recorded"])
+        names = [name for name, _ in stats.to_records()]
+        self.assertTrue("markov_attribution.solve.seconds" in names)
+
+    def test_shapley_channels(self):
+        # The sets removed for the Shapley values are not channels
+        stats = AttributionStats()
+        MarkovAttribution(
+            test_data,
+            "path",
+            "conversion",
+            "value",
+            sep,
+            method="shapley",
+            stats=stats,
+        )
+        comp = ["C1", "C2", "C3", "C4", "C5"]
+        self.assertTrue(sorted(stats.channels) == comp)
+
+    def test_trace_memory(self):
+        stats = AttributionStats(trace_memory=True)
+        MarkovAttribution(
+            test_data, "path", "conversion", "value", sep, stats=stats
+        )
+        self.assertTrue(stats.stages["parse"]["traced_peak_bytes"] > 0)
+        for record in stats.channels.values():
+            self.assertTrue(record["traced_peak_bytes"] > 0)
+
+    def test_pool(self):
+        # The workers do not report their channels
+        stats = AttributionStats()
+        MarkovAttribution(
+            test_data,
+            "path",
+            "conversion",
+            "value",
+            sep,
+            n_jobs=2,
+            stats=stats,
+        )
+        self.assertTrue(stats.channels == {})
+        self.assertFalse(stats.stages["removal"]["channels_recorded"])
+
+    def test_nested_trace_memory(self):
+        # The inner stage must not reset the peak of the outer one
+        stats = AttributionStats(trace_memory=True)
+        with stats.stage("outer"):
+            block = bytearray(50 * 2**20)
+            del block
+            with stats.stage("inner"):
+                pass
+        outer = stats.stages["outer"]["traced_peak_bytes"]
+        inner = stats.stages["inner"]["traced_peak_bytes"]
+        self.assertTrue(outer >= 50 * 2**20)
+        self.assertTrue(inner < 50 * 2**20)
+
+
+if __name__ == "__main__":
+    unittest.main()